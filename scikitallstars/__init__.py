@@ -1 +1,30 @@
+import importlib
 
+__all__ = [
+    "aio",
+    "allstars",
+    "avd",
+    "benchmark",
+    "datasource",
+    "depict",
+    "distributed",
+    "ensemble",
+    "evaluation",
+    "estimators",
+    "feature_selector",
+    "model_store",
+    "neighbors",
+    "predictor",
+    "preprocess",
+    "registry",
+    "report",
+    "scheduler",
+    "splitters",
+    "stacking",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module("scikitallstars." + name)
+    raise AttributeError("module 'scikitallstars' has no attribute '{}'".format(name))
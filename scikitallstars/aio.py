@@ -0,0 +1,136 @@
+import asyncio
+import inspect
+
+import pandas as pd
+
+from scikitallstars import allstars, stacking
+
+DONE = object()
+
+
+def get_loop():
+    if hasattr(asyncio, "get_running_loop"):
+        return asyncio.get_running_loop()
+    return asyncio.get_event_loop()
+
+
+def pick(function, kwargs):
+    names = inspect.signature(function).parameters.keys()
+    return {key: value for key, value in kwargs.items() if key in names}
+
+
+class AsyncSearch:
+    def __init__(self, run, executor=None):
+        self.run = run
+        self.loop = get_loop()
+        self.queue = asyncio.Queue()
+        self.objective = None
+        self.stopped = False
+        self.future = self.loop.run_in_executor(executor, self.main)
+
+    def main(self):
+        try:
+            return self.run(self)
+        finally:
+            self.emit(DONE)
+
+    def emit(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def attach(self, objective):
+        self.objective = objective
+        if self.stopped:
+            objective.stop()
+        return objective
+
+    def stop(self):
+        self.stopped = True
+        if self.objective is not None:
+            self.objective.stop()
+
+    async def cancel(self):
+        self.stop()
+        return await asyncio.shield(self.future)
+
+    async def result(self):
+        try:
+            return await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            self.stop()
+            raise
+
+    def __await__(self):
+        return self.result().__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.queue.get()
+        if event is DONE:
+            raise StopAsyncIteration
+        return event
+
+
+def fit_async(X_train, y_train=None, executor=None, **kwargs):
+    callback = kwargs.pop("telemetry_callback", None)
+    kwargs.setdefault("show_progress_bar", False)
+
+    def run(search):
+        def telemetry(record):
+            if callback is not None:
+                callback(record)
+            search.emit(
+                {
+                    "event": "trial",
+                    "trial": record,
+                    "best_score": search.objective.best_score,
+                }
+            )
+
+        kwargs["telemetry_callback"] = telemetry
+        objective = search.attach(
+            allstars.build_objective(
+                X_train, y_train, **pick(allstars.build_objective, kwargs)
+            )
+        )
+        allstars.search(objective, **pick(allstars.search, kwargs))
+        return allstars.finish(objective, **pick(allstars.finish, kwargs))
+
+    return AsyncSearch(run, executor=executor)
+
+
+def get_best_stacking_async(objective, X_train, y_train, executor=None, **kwargs):
+    kwargs.setdefault("show_progress_bar", False)
+    if type(y_train) is not pd.core.series.Series:
+        y_train = pd.DataFrame(y_train)[0]
+
+    def run(search):
+        def progress(study, trial):
+            search.emit(
+                {
+                    "event": "trial",
+                    "trial": {
+                        "trial": trial.number,
+                        "state": str(trial.state).split(".")[-1].lower(),
+                        "score": trial.value,
+                    },
+                    "best_score": search.objective.best_score,
+                }
+            )
+
+        stacking_objective = search.attach(
+            stacking.StackingObjective(
+                objective,
+                allstars.as_frame(X_train),
+                y_train,
+                **pick(stacking.StackingObjective, kwargs)
+            )
+        )
+        return stacking.stacking_search(
+            stacking_objective,
+            callbacks=[progress],
+            **pick(stacking.stacking_search, kwargs)
+        )
+
+    return AsyncSearch(run, executor=executor)
@@ -1,22 +1,40 @@
+import copy
+import json
+import sys
+import threading
 import time
 import timeit
+import tracemalloc
+import warnings
 
-import matplotlib.pyplot as plt
 import numpy as np
-import optuna
 import pandas as pd
 from sklearn import metrics
 
 
-from sklearn.feature_selection import SelectFromModel
-
-
 
 import scikitallstars.timeout_decorator as timeout_decorator
+from scikitallstars.lazy import LazyModule
 from scikitallstars.estimators import Classifier, Regressor
+from scikitallstars.datasource import DataSource
+from scikitallstars.model_store import ModelStore
+from scikitallstars.neighbors import NeighborGraph
+from scikitallstars.preprocess import (
+    as_frame,
+    concat_rows,
+    downcast,
+    issparse,
+    nbytes,
+    select_columns,
+    select_rows,
+)
+from scikitallstars.registry import capable, categorical_mask, get_family
+from scikitallstars.scheduler import FamilyScheduler
 from scikitallstars.timeout import on_timeout, handler_func
 from sklearn.model_selection import train_test_split
 
+optuna = LazyModule("optuna")
+
 
 
 
@@ -41,6 +59,7 @@ class Objective:
             "RandomForest",
             "ExtraTrees",
             "GradientBoosting",
+            "HistGradientBoosting",
         ],
         regressor_names=[
             "LinearRegression",
@@ -54,11 +73,35 @@ class Objective:
             "RandomForest",
             "ExtraTrees",
             "GradientBoosting",
+            "HistGradientBoosting",
         ],
         classification_metrics="f1_score",
         test_size=0.1,
-        split_random_state=None
+        split_random_state=None,
+        keep_predictions=False,
+        model_store=None,
+        categorical_features=None,
+        dtype=None,
+        telemetry_path=None,
+        telemetry_callback=None,
+        trace_memory=False,
     ):
+        self.telemetry = []
+        self.stopped = False
+        self.domain = None
+        self.domain_model = None
+        self.telemetry_path = telemetry_path
+        self.telemetry_callback = telemetry_callback
+        self.trace_memory = trace_memory
+        self.last_trial_end = None
+        self.dtype = dtype
+        self.memory_saved = 0
+        if dtype is not None:
+            before = nbytes(x_train) + nbytes(x_valid)
+            x_train = downcast(x_train, dtype)
+            x_valid = downcast(x_valid, dtype)
+            self.memory_saved = before - nbytes(x_train) - nbytes(x_valid)
+        self.upcast_warned = []
         self.x_train = x_train
         self.x_valid = x_valid
         self.y_train = y_train
@@ -71,13 +114,36 @@ class Objective:
         self.best_model = None
         self.test_size = test_size
         self.split_random_state = split_random_state
+        self.keep_predictions = keep_predictions
+        if keep_predictions and split_random_state is None:
+            self.split_random_state = 0
+        self.valid_predictions = {}
+        if model_store is not None and not keep_predictions:
+            raise ValueError("model_store is only used with keep_predictions=True")
+        self.model_store = model_store
+        if keep_predictions and model_store is None:
+            self.model_store = ModelStore()
+        self.y_valid_kept = None
+        self.valid_classes = None
+        self.categorical_features = categorical_features
         self.classifier_names = classifier_names
         self.regressor_names = regressor_names
         self.classification_metrics = classification_metrics
         self.times = {}
         self.scores = {}
         self.debug = False
+        self.knn_graph = True
+        self.neighbor_graphs = {}
+        self.score_stale = False
         self.scalers = ["StandardScaler", "MinMaxScaler"]
+        self.sparse = issparse(x_train)
+        if self.sparse:
+            self.x_train = x_train.tocsr()
+            if x_valid is not None:
+                self.x_valid = x_valid.tocsr()
+            self.scalers = ["MaxAbsScaler", "NoScaler"]
+            self.classifier_names = capable(classifier_names, "sparse")
+            self.regressor_names = capable(regressor_names, "sparse", is_regressor=True)
         self.is_regressor = True
         if len(set(y_train)) < 3:
             self.is_regressor = False
@@ -88,6 +154,15 @@ class Objective:
         self.gb_max_depth = [2, 32]
         self.gb_warm_start = [True, False]
 
+        self.hgb_learning_rate = [0.01, 0.3]
+        self.hgb_max_iter = [50, 500]
+        self.hgb_max_leaf_nodes = [8, 128]
+        self.hgb_max_depth = [2, 16]
+        self.hgb_min_samples_leaf = [5, 100]
+        self.hgb_l2_regularization = [1e-8, 10]
+        self.hgb_n_iter_no_change = 10
+        self.hgb_validation_fraction = 0.1
+
         self.et_n_estimators = [50, 300]
         self.et_max_depth = [2, 32]
         self.et_warm_start = [True, False]
@@ -162,10 +237,47 @@ class Objective:
     # @on_timeout(limit=5, handler=handler_func, hint=u'call')
     @timeout_decorator.timeout(10)
     def __call__(self, trial):
+        record = self.start_record(trial)
+        try:
+            score = self.run_trial(trial, record)
+            record["state"] = "complete"
+            record["score"] = score
+            return score
+        except timeout_decorator.TimeoutError:
+            record["state"] = "timeout"
+            raise
+        except optuna.TrialPruned:
+            record["state"] = "stopped" if self.stopped else "pruned"
+            raise
+        except Exception as e:
+            record["state"] = "failed"
+            record["error"] = repr(e)
+            raise
+        finally:
+            self.finish_record(record)
+
+    def stop(self):
+        self.stopped = True
+
+    def stop_callback(self, study, trial):
+        if self.stopped:
+            study.stop()
+
+    def check_stopped(self, deadline=True):
+        if self.stopped:
+            raise optuna.TrialPruned()
+        if deadline:
+            # the trial limit of __call__ when it runs off the main thread
+            timeout_decorator.check_deadline()
+
+    def run_trial(self, trial, record):
+        self.check_stopped()
+        seconds = record["seconds"]
+        start = timeit.default_timer()
         if self.support is None:
             if self.y_valid is None:
                 x_train, x_valid, y_train, y_valid = train_test_split(
-                    self.x_train, self.y_train, test_size=self.test_size
+                    self.x_train, self.y_train, test_size=self.test_size, random_state=self.split_random_state
                 )
             else:
                 x_train = self.x_train
@@ -175,439 +287,301 @@ class Objective:
         else:
             if self.y_valid is None:
                 x_train, x_valid, y_train, y_valid = train_test_split(
-                    self.x_train.iloc[:, self.support], self.y_train, test_size=self.test_size, random_state=self.split_random_state
+                    select_columns(self.x_train, self.support), self.y_train, test_size=self.test_size, random_state=self.split_random_state
                 )
             else:
-                x_train = self.x_train.iloc[:, self.support]
-                x_valid = self.x_valid.iloc[:, self.support]
+                x_train = select_columns(self.x_train, self.support)
+                x_valid = select_columns(self.x_valid, self.support)
                 y_train = self.y_train
                 y_valid = self.y_valid
+        seconds["split"] = timeit.default_timer() - start
+        record["n_train"] = x_train.shape[0]
+        record["n_valid"] = x_valid.shape[0]
+        record["n_features"] = x_train.shape[1]
 
+        start = timeit.default_timer()
         params = self.generate_params(trial, x_train)
+        seconds["suggest"] = timeit.default_timer() - start
+        record["model_name"] = params["model_name"]
+        record["standardize"] = params["standardize"]
+        record["params"] = json.dumps(params["model_params"], default=str)
+        if self.dtype is not None:
+            self.warn_upcast(params["model_name"], x_train)
 
         if len(set(y_train)) < 3:
             self.is_regressor = False
-            model = Classifier(params, debug=self.debug)
-            seconds = self.model_fit(model, x_train, y_train)
-            if params["model_name"] not in self.times.keys():
-                self.times[params["model_name"]] = []
-            self.times[params["model_name"]].append(seconds)
-
-            if self.classification_metrics == "f1_score":
-                if self.support is None:
-                    score = metrics.f1_score(model.predict(x_valid), y_valid)
-                    # score = metrics.f1_score(model.predict(self.x_train), self.y_train)
-                else:
-                    # score = metrics.f1_score(model.predict(self.x_train.iloc[:, self.support]), self.y_train)
-                    # score = metrics.f1_score(model.predict(x_valid.iloc[:, self.support]), y_valid)
-                    score = metrics.f1_score(model.predict(x_valid), y_valid)
-            else:
-                if self.support is None:
-                    score = model.model.score(x_valid, y_valid)
-                    # score = model.model.score(self.x_train, self.y_train)
-                else:
-                    # score = model.model.score(self.x_train.iloc[:, self.support], self.y_train)
-                    score = model.model.score(x_valid, y_valid)
-
-            if params["model_name"] not in self.scores.keys():
-                self.scores[params["model_name"]] = []
-            self.scores[params["model_name"]].append(score)
-
-            if self.best_score < score:
-                self.best_score = score
-                self.best_model = model
-            if params["model_name"] not in self.best_scores.keys():
-                self.best_scores[params["model_name"]] = 0
-            if self.best_scores[params["model_name"]] < score:
-                self.best_scores[params["model_name"]] = score
-                self.best_models[params["model_name"]] = model
-
+            model = Classifier(params, debug=self.debug, support=self.support)
         else:
             self.is_regressor = True
             model = Regressor(params, debug=self.debug, support=self.support)
-            seconds = self.model_fit(model, x_train, y_train)
-            if params["model_name"] not in self.times.keys():
-                self.times[params["model_name"]] = []
-            self.times[params["model_name"]].append(seconds)
-
-            if self.support is None:
-                # score = model.model.score(self.x_train, self.y_train)
-                score = model.model.score(x_valid, y_valid)
-            else:
-                # score = model.model.score(self.x_train.iloc[:, self.support], self.y_train)
-                score = model.model.score(x_valid, y_valid)
-            if params["model_name"] not in self.scores.keys():
-                self.scores[params["model_name"]] = []
-            self.scores[params["model_name"]].append(score)
-
-            if self.best_score < score:
-                self.best_score = score
-                self.best_model = model
-            if params["model_name"] not in self.best_scores.keys():
-                self.best_scores[params["model_name"]] = 0
-            if self.best_scores[params["model_name"]] < score:
-                self.best_scores[params["model_name"]] = score
-                self.best_models[params["model_name"]] = model
+        self.check_stopped()
+        graph = None
+        if self.knn_graph and params["model_name"] == "kNN":
+            start = timeit.default_timer()
+            graph = self.neighbor_graph(model, x_train, x_valid, y_train, y_valid)
+            x_train, x_valid, y_train, y_valid = graph.split
+            fit_seconds = timeit.default_timer() - start
+            seconds["scale"] = 0
+            seconds["fit"] = fit_seconds
+        else:
+            fit_seconds = self.model_fit(model, x_train, y_train)
+            self.check_stopped(deadline=False)
+            seconds["scale"] = model.timings["scale"]
+            seconds["fit"] = model.timings["fit"]
+        if params["model_name"] not in self.times.keys():
+            self.times[params["model_name"]] = []
+        self.times[params["model_name"]].append(fit_seconds)
+
+        if graph is None:
+            pred = model.predict(x_valid)
+            seconds["scale"] += model.timings["scale"]
+            seconds["predict"] = model.timings["predict"]
+        else:
+            start = timeit.default_timer()
+            pred = graph.predict(
+                model.model.n_neighbors, model.model.weights, self.is_regressor
+            )
+            seconds["predict"] = timeit.default_timer() - start
+
+        start = timeit.default_timer()
+        if self.is_regressor:
+            score = metrics.r2_score(y_valid, pred)
+        elif self.classification_metrics == "f1_score":
+            score = metrics.f1_score(pred, y_valid)
+        else:
+            score = metrics.accuracy_score(y_valid, pred)
+        seconds["score"] = timeit.default_timer() - start
+
+        if graph is not None:
+            if self.keep_predictions or score > self.best_scores.get(
+                params["model_name"], 0
+            ):
+                # build the real index only for models that are kept
+                graph.fit(model)
+
+        if params["model_name"] not in self.scores.keys():
+            self.scores[params["model_name"]] = []
+        self.scores[params["model_name"]].append(score)
+
+        if self.best_score < score:
+            self.best_score = score
+            self.best_model = model
+        if params["model_name"] not in self.best_scores.keys():
+            self.best_scores[params["model_name"]] = 0
+        if self.best_scores[params["model_name"]] < score:
+            self.best_scores[params["model_name"]] = score
+            self.best_models[params["model_name"]] = model
+
+        if self.keep_predictions:
+            start = timeit.default_timer()
+            self.keep_prediction(trial.number, model, x_valid, y_valid, score)
+            seconds["keep"] = timeit.default_timer() - start
 
         return score
 
+    def neighbor_graph(self, model, x_train, x_valid, y_train, y_valid):
+        key = (model.params["standardize"], self.knn_n_neighbors[1])
+        if key not in self.neighbor_graphs.keys():
+            self.neighbor_graphs[key] = NeighborGraph(
+                copy.deepcopy(model.standardizer),
+                x_train,
+                y_train,
+                x_valid,
+                y_valid,
+                self.knn_n_neighbors[1],
+            )
+        return self.neighbor_graphs[key]
+
+    def start_record(self, trial):
+        now = timeit.default_timer()
+        record = {
+            "trial": trial.number,
+            "started": time.time(),
+            "state": "running",
+            "model_name": None,
+            "standardize": None,
+            "params": None,
+            "score": None,
+            "error": None,
+            "n_train": None,
+            "n_valid": None,
+            "n_features": None,
+            "seconds": {"overhead": None},
+            "peak_memory": None,
+            "_start": now,
+        }
+        if self.last_trial_end is not None:
+            record["seconds"]["overhead"] = now - self.last_trial_end
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        return record
+
+    def finish_record(self, record):
+        self.last_trial_end = timeit.default_timer()
+        record["seconds"]["total"] = self.last_trial_end - record.pop("_start")
+        if self.trace_memory:
+            record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        else:
+            record["peak_memory"] = peak_rss()
+        self.telemetry.append(record)
+        if self.telemetry_path is not None:
+            with open(self.telemetry_path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        if self.telemetry_callback is not None:
+            self.telemetry_callback(record)
+
+    def trials_dataframe(self):
+        return pd.json_normalize(self.telemetry)
+
+    def trials_table(self):
+        import pyarrow
+
+        return pyarrow.Table.from_pandas(self.trials_dataframe())
+
+    def warn_upcast(self, model_name, x):
+        family = get_family(model_name, is_regressor=self.is_regressor)
+        if family.float32 or model_name in self.upcast_warned:
+            return
+        self.upcast_warned.append(model_name)
+        extra = x.shape[0] * x.shape[1] * (8 - np.dtype(self.dtype).itemsize)
+        warnings.warn(
+            "{} upcasts {} input to float64 ({:.1f} MB copy)".format(
+                model_name, self.dtype, extra / 1e6
+            )
+        )
+
+    def keep_prediction(self, key, model, x_valid, y_valid, score):
+        kept = self.model_store.add(key, model.params["model_name"], score, model)
+        for evicted in self.model_store.evicted:
+            self.valid_predictions.pop(evicted, None)
+        self.model_store.evicted = []
+        if not kept:
+            return
+
+        if self.is_regressor:
+            pred = model.predict(x_valid)
+        elif hasattr(model.model, "predict_proba"):
+            pred = model.predict_proba(x_valid)[:, 1]
+        else:
+            pred = np.where(model.predict(x_valid) == model.model.classes_[1], 1, 0)
+        self.valid_predictions[key] = np.ravel(pred).astype(np.float32)
+        if self.y_valid_kept is None:
+            self.y_valid_kept = np.ravel(np.array(y_valid))
+        if not self.is_regressor:
+            self.valid_classes = model.model.classes_
+
     @on_timeout(limit=600, handler=handler_func, hint=u"model_fit")
     def model_fit(self, model, x_train, y_train):
-        return timeit.timeit(lambda: model.fit(x_train, y_train), number=1)
+        # fit in a helper thread so that stop() returns control without waiting
+        # for the fit, which then finishes in the background and is discarded
+        result = {}
+
+        def fit():
+            try:
+                result["seconds"] = timeit.timeit(
+                    lambda: model.fit(x_train, y_train), number=1
+                )
+            except BaseException as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=fit, daemon=True)
+        thread.start()
+        while thread.is_alive():
+            thread.join(0.05)
+            self.check_stopped(deadline=False)
+        if "error" in result.keys():
+            raise result["error"]
+        return result["seconds"]
 
     def generate_params(self, trial, x):
         params = {}
 
-        params["standardize"] = trial.suggest_categorical("standardize", self.scalers)
         if len(set(self.y_train)) < 3:
             params["model_name"] = trial.suggest_categorical(
                 "model_name", self.classifier_names
             )
-            model_params = {}
-
-            if params["model_name"] == "SVC":
-                model_params["kernel"] = trial.suggest_categorical(
-                    "svc_kernel", ["linear", "rbf"]
-                )
-                model_params["C"] = trial.suggest_loguniform(
-                    "svm_c", self.svm_c[0], self.svm_c[1]
-                )
-                # model_params["epsilon"] = trial.suggest_loguniform(
-                #    "svm_epsilon", self.svm_epsilon[0], self.svm_epsilon[1]
-                # )
-                if model_params["kernel"] == "rbf":
-                    model_params["gamma"] = trial.suggest_categorical(
-                        "svc_gamma", ["auto", "scale"]
-                    )
-                else:
-                    model_params["gamma"] = "auto"
-                model_params["max_iter"] = self.svm_max_iter
-                model_params["probability"] = True
-
-            elif params["model_name"] == "RandomForest":
-                model_params["n_estimators"] = trial.suggest_int(
-                    "rf_n_estimators", self.rf_n_estimators[0], self.rf_n_estimators[1]
-                )
-                model_params["max_features"] = trial.suggest_categorical(
-                    "rf_max_features", self.rf_max_features
-                )
-                model_params["n_jobs"] = -1
-                model_params["max_depth"] = trial.suggest_int(
-                    "rf_max_depth", self.rf_max_depth[0], self.rf_max_depth[1]
-                )
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "rf_warm_start", self.rf_warm_start
-                )
-
-            elif params["model_name"] == "MLP":
-                layers = []
-                n_layers = trial.suggest_int(
-                    "n_layers", self.mlp_n_layers[0], self.mlp_n_layers[1]
-                )
-                for i in range(n_layers):
-                    layers.append(
-                        trial.suggest_int(
-                            str(i), self.mlp_n_neurons[0], self.mlp_n_neurons[1]
-                        )
-                    )
-                model_params["hidden_layer_sizes"] = set(layers)
-                model_params["max_iter"] = self.mlp_max_iter
-                model_params["early_stopping"] = True
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "mlp_warm_start", self.mlp_warm_start
-                )
-                model_params["activation"] = trial.suggest_categorical(
-                    "mlp_activation", self.mlp_activation
-                )
-
-            elif params["model_name"] == "LogisticRegression":
-                model_params["C"] = trial.suggest_loguniform(
-                    "lr_C", self.lr_C[0], self.lr_C[0]
-                )
-                model_params["solver"] = trial.suggest_categorical(
-                    "lr_solver", self.lr_solver
-                )
-                model_params["max_iter"] = self.lr_max_iter
-
-            elif params["model_name"] == "GradientBoosting":
-                model_params["loss"] = trial.suggest_categorical("loss", self.gb_loss)
-                model_params["n_estimators"] = trial.suggest_int(
-                    "gb_n_estimators", self.gb_n_estimators[0], self.gb_n_estimators[1]
-                )
-                model_params["max_depth"] = trial.suggest_int(
-                    "gb_max_depth", self.gb_max_depth[0], self.gb_max_depth[1]
-                )
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "gb_warm_start", self.gb_warm_start
-                )
-
-            elif params["model_name"] == "ExtraTrees":
-                model_params["n_estimators"] = trial.suggest_int(
-                    "et_n_estimators", self.et_n_estimators[0], self.et_n_estimators[1]
-                )
-                model_params["max_depth"] = trial.suggest_int(
-                    "et_max_depth", self.et_max_depth[0], self.et_max_depth[1]
-                )
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "et_warm_start", self.et_warm_start
-                )
-
-            elif params["model_name"] == "AdaBoost":
-                model_params["n_estimators"] = trial.suggest_int(
-                    "ab_n_estimators", self.ab_n_estimators[0], self.ab_n_estimators[1]
-                )
-                # model_params["loss"] = trial.suggest_categorical(
-                #    "ab_loss", self.ab_loss
-                # )
-
-            elif params["model_name"] == "kNN":
-                model_params["n_neighbors"] = trial.suggest_int(
-                    "knn_n_neighbors", self.knn_n_neighbors[0], self.knn_n_neighbors[1]
-                )
-                model_params["weights"] = trial.suggest_categorical(
-                    "knn_weights", self.knn_weights
-                )
-                model_params["algorithm"] = trial.suggest_categorical(
-                    "knn_algorithm", self.knn_algorithm
-                )
-                model_params["leaf_size"] = trial.suggest_int(
-                    "knn_leaf_size", self.knn_leaf_size[0], self.knn_leaf_size[1]
-                )
-
-            elif params["model_name"] == "Ridge":
-                model_params["alpha"] = trial.suggest_loguniform(
-                    "ridge_alpha", self.ridge_alpha[0], self.ridge_alpha[1]
-                )
-                model_params["max_iter"] = self.ridge_max_iter
-                model_params["normalize"] = trial.suggest_categorical(
-                    "ridge_normalize", self.ridge_normalize
-                )
-                model_params["solver"] = trial.suggest_categorical(
-                    "ridge_solver", self.ridge_solver
-                )
-
-            elif params["model_name"] == "QDA":
-                pass
-            elif params["model_name"] == "LDA":
-                pass
-            else:
-                raise RuntimeError("unspport classifier", params["model_name"])
-            params["model_params"] = model_params
-
+            family = get_family(params["model_name"], is_regressor=False)
         else:
             params["model_name"] = trial.suggest_categorical(
                 "model_name", self.regressor_names
             )
-            model_params = {}
-
-            if params["model_name"] == "GradientBoosting":
-                # model_params["loss"] = trial.suggest_categorical(
-                #    "gb_loss", ["ls", "lad", "huber", "quantile"]
-                # )
-                model_params["learning_rate"] = trial.suggest_loguniform(
-                    "learning_rate_init",
-                    self.gb_learning_rate_init[0],
-                    self.gb_learning_rate_init[1],
-                )
-                model_params["n_estimators"] = trial.suggest_int(
-                    "gb_n_estimators", self.gb_n_estimators[0], self.gb_n_estimators[1]
-                )
-                # model_params["criterion"] = trial.suggest_categorical(
-                #    "gb_criterion", ["friedman_mse", "mse", "mae"]
-                # )
-                model_params["max_depth"] = trial.suggest_int(
-                    "gb_max_depth", self.gb_max_depth[0], self.gb_max_depth[1]
-                )
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "gb_warm_start", self.gb_warm_start
-                )
-                # model_params["max_features"] = trial.suggest_categorical(
-                #    "gb_max_features", ["auto", "sqrt", "log2"]
-                # )
-                # model_params["tol"] = trial.suggest_loguniform(
-                #    "gb_tol", 1e-5, 1e-3
-                # )
-
-            elif params["model_name"] == "ExtraTrees":
-                model_params["n_estimators"] = trial.suggest_int(
-                    "et_n_estimators", self.et_n_estimators[0], self.et_n_estimators[1]
-                )
-                # model_params["criterion"] = trial.suggest_categorical(
-                #    "et_criterion", ["mse", "mae"]
-                # )
-                model_params["max_depth"] = trial.suggest_int(
-                    "et_max_depth", self.et_max_depth[0], self.et_max_depth[1]
-                )
-                model_params["max_features"] = trial.suggest_categorical(
-                    "et_max_features", ["auto"] #, "sqrt", "log2"]
-                )
-                model_params["bootstrap"] = True
-                model_params["oob_score"] = trial.suggest_categorical(
-                    "et_oob_score", [True]
-                )
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "et_warm_start", self.et_warm_start
-                )
-
-            elif params["model_name"] == "RandomForest":
-                model_params["n_estimators"] = trial.suggest_int(
-                    "rf_n_estimators", self.rf_n_estimators[0], self.rf_n_estimators[1]
-                )
-                # model_params["criterion"] = trial.suggest_categorical(
-                #    "rf_criterion", ["mse", "mae"]
-                # )
-                model_params["max_depth"] = trial.suggest_int(
-                    "rf_max_depth", self.rf_max_depth[0], self.rf_max_depth[1]
-                )
-                model_params["max_features"] = trial.suggest_categorical(
-                    "rf_max_features", self.rf_max_features
-                )
-                model_params["bootstrap"] = True
-                model_params["oob_score"] = trial.suggest_categorical(
-                    "rf_oob_score", [True]
-                )
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "rf_warm_start", self.rf_warm_start
-                )
-
-            elif params["model_name"] == "AdaBoost":
-                model_params["n_estimators"] = trial.suggest_int(
-                    "ab_n_estimators", self.ab_n_estimators[0], self.ab_n_estimators[1]
-                )
-                model_params["learning_rate"] = trial.suggest_loguniform(
-                    "ab_learning_rate", 0.1, 1.0
-                )
-                model_params["loss"] = trial.suggest_categorical(
-                    "ab_loss", self.ab_loss
-                )
-
-            elif params["model_name"] == "MLP":
-                layers = []
-                n_layers = trial.suggest_int(
-                    "n_layers", self.mlp_n_layers[0], self.mlp_n_layers[1]
-                )
-                for i in range(n_layers):
-                    layers.append(
-                        trial.suggest_int(
-                            str(i), self.mlp_n_neurons[0], self.mlp_n_neurons[1]
-                        )
-                    )
-                model_params["hidden_layer_sizes"] = set(layers)
-                # model_params["activation"] = trial.suggest_categorical(
-                #    "mlp_activation", self.mlp_activation
-                # )
-                # model_params["solver"] = trial.suggest_categorical(
-                #    "mlp_solver", ["sgd", "adam"]
-                # )
-                model_params["solver"] = "adam"
-                model_params["learning_rate"] = trial.suggest_categorical(
-                    "mlp_learning_rate", ["constant", "invscaling", "adaptive"]
-                )
-                if model_params["solver"] in ["sgd", "adam"]:
-                    model_params["learning_rate_init"] = trial.suggest_loguniform(
-                        "mlp_learning_rate_init", 1e-4, 1e-2
-                    )
-                model_params["max_iter"] = self.mlp_max_iter
-                model_params["early_stopping"] = True
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "mlp_warm_start", self.mlp_warm_start
-                )
-
-            elif params["model_name"] == "SVR":
-                model_params["kernel"] = trial.suggest_categorical(
-                    "svm_kernel", self.svm_kernel
-                )
-                model_params["C"] = trial.suggest_loguniform(
-                    "svm_c", self.svm_c[0], self.svm_c[1]
-                )
-                if model_params["kernel"] == "rbf":
-                    model_params["gamma"] = trial.suggest_categorical(
-                        "svc_gamma", ["auto"] #, "scale"]
-                    )
-                else:
-                    model_params["gamma"] = "auto"
-                model_params["max_iter"] = self.svm_max_iter
-                # model_params["epsilon"] = trial.suggest_loguniform(
-                #    "svm_epsilon", self.svm_epsilon[0], self.svm_epsilon[1]
-                # )
-
-            elif params["model_name"] == "kNN":
-                model_params["n_neighbors"] = trial.suggest_int(
-                    "knn_n_neighbors", self.knn_n_neighbors[0], self.knn_n_neighbors[1]
-                )
-                model_params["weights"] = trial.suggest_categorical(
-                    "knn_weights", self.knn_weights
-                )
-                model_params["algorithm"] = trial.suggest_categorical(
-                    "knn_algorithm", self.knn_algorithm
-                )
-
-            elif params["model_name"] == "Ridge":
-                model_params["alpha"] = trial.suggest_loguniform(
-                    "ridge_alpha", self.ridge_alpha[0], self.ridge_alpha[1]
-                )
-                model_params["max_iter"] = self.ridge_max_iter
-                # model_params["normalize"] = trial.suggest_categorical(
-                #    "ridge_normalize", self.ridge_normalize
-                #)
-                model_params["solver"] = trial.suggest_categorical(
-                    "ridge_solver", self.ridge_solver
-                )
-
-            elif params["model_name"] == "Lasso":
-                model_params["alpha"] = trial.suggest_loguniform(
-                    "lasso_alpha", self.lasso_alpha[0], self.lasso_alpha[1]
-                )
-                model_params["max_iter"] = self.lasso_max_iter
-                model_params["warm_start"] = trial.suggest_categorical(
-                    "lasso_warm_start", self.lasso_warm_start
-                )
-                # model_params["normalize"] = trial.suggest_categorical(
-                #    "lasso_normalize", self.lasso_normalize
-                #)
-                model_params["selection"] = trial.suggest_categorical(
-                    "lasso_selection", self.lasso_selection
-                )
-
-            elif params["model_name"] == "PLS":
-                if self.support is None:
-                    model_params["n_components"] = trial.suggest_int(
-                        "n_components", 2, self.x_train.shape[1]
-                    )
-                else:
-                    model_params["n_components"] = trial.suggest_int(
-                        "n_components", 2, self.x_train.iloc[:, self.support].shape[1]
-                    )
-                model_params["max_iter"] = self.pls_max_iter
-                model_params["scale"] = trial.suggest_categorical(
-                    "pls_scale", self.pls_scale
-                )
-                # model_params["algorithm"] = trial.suggest_categorical(
-                #    "pls_algorithm", self.pls_algorithm
-                # )
-                model_params["tol"] = trial.suggest_loguniform(
-                    "pls_tol",
-                    self.pls_tol[0],
-                    self.pls_tol[1],
-                )
+            family = get_family(params["model_name"], is_regressor=True)
+        if family.categorical and categorical_mask(self) is not None:
+            # native categorical columns must reach the model unscaled
+            params["standardize"] = trial.suggest_categorical(
+                "categorical_standardize", ["NoScaler"]
+            )
+        else:
+            params["standardize"] = trial.suggest_categorical(
+                "standardize", self.scalers
+            )
+        params["model_params"] = family.search_space(self, trial, x, params)
 
-            elif params["model_name"] == "LinearRegression":
-                model_params["fit_intercept"] = trial.suggest_categorical(
-                    "linear_regression_fit_intercept",
-                    self.linear_regression_fit_intercept,
-                )
-                # model_params["normalize"] = trial.suggest_categorical(
-                #    "linear_regression_normalize", self.linear_regression_normalize
-                #)
+        return params
 
-            else:
-                raise RuntimeError("unspport regressor", params["model_name"])
-            params["model_params"] = model_params
+    def evaluate(self, model, x, y, support=None):
+        if not self.is_regressor and self.classification_metrics == "f1_score":
+            return metrics.f1_score(model.predict(x, support=support), y)
+        return model.model.score(model.transform(x, support=support), y)
+
+    def update(self, x_new, y_new, window=None, tolerance=0.05, n_estimators=10):
+        x_new = as_frame(x_new)
+        if type(y_new) is not pd.core.series.Series:
+            y_new = pd.DataFrame(y_new)[0]
+        if type(self.y_train) is not pd.core.series.Series:
+            self.y_train = pd.DataFrame(self.y_train)[0]
+
+        # test-then-train: score the new rows before the models learn from them
+        if window is None:
+            window = x_new.shape[0]
+        x_window = select_rows(x_new, slice(-window, None))
+        y_window = y_new.iloc[-window:]
+        self.update_scores = {
+            name: self.evaluate(model, x_window, y_window, support=self.support)
+            for name, model in self.best_models.items()
+        }
+        window_score = self.evaluate(
+            self.best_model, x_window, y_window, support=self.support
+        )
+        self.needs_refit = window_score < self.best_score - tolerance
+
+        self.x_train = concat_rows(self.x_train, x_new)
+        self.y_train = pd.concat([self.y_train, y_new], ignore_index=True)
+        self.neighbor_graphs = {}
+
+        models = list(self.best_models.items())
+        if self.best_model not in self.best_models.values():
+            models.append(("best_model", self.best_model))
+        self.updated = {}
+        for name, model in models:
+            self.updated[name] = model.update(
+                x_new, y_new, support=self.support, n_estimators=n_estimators
+            )
+        return self.needs_refit
 
-        return params
+    def fit_domain(self, method="knn", **kwargs):
+        from scikitallstars import avd
 
-    def predict(self, x):
-        return self.best_model.predict(pd.DataFrame(x), support=self.support)
+        if method == "knn":
+            self.domain = avd.KNN(**kwargs)
+        elif method == "ocsvm":
+            self.domain = avd.OCSVM(**kwargs)
+        else:
+            raise RuntimeError("unsupported domain model", method)
+        self.domain.fit(self.best_model.transform(self.x_train, support=self.support))
+        self.domain_model = self.best_model
+        return self.domain
+
+    def predict(self, x, return_domain=False):
+        if not return_domain:
+            return self.best_model.predict(as_frame(x), support=self.support)
+        if self.domain is None or self.domain_model is not self.best_model:
+            raise RuntimeError("no domain model for best_model, call fit_domain first")
+        x = self.best_model.transform(as_frame(x), support=self.support)
+        return self.best_model.model.predict(x), self.domain.transform_bin(x)
 
     def score(self, x, y):
         if type(y) is not pd.core.series.Series:
@@ -615,7 +589,7 @@ class Objective:
                 y = pd.DataFrame(y)[0]
             except:
                 pass
-        return self.best_model.score(pd.DataFrame(x), y, support=self.support)
+        return self.best_model.score(as_frame(x), y, support=self.support)
 
 
 
@@ -627,7 +601,7 @@ class Objective:
 
 def fit(
     X_train,
-    y_train,
+    y_train=None,
     x_valid=None,
     y_valid=None,
     feature_selection=True,
@@ -635,13 +609,107 @@ def fit(
     timeout=100,
     n_trials=100,
     show_progress_bar=True,
+    keep_predictions=False,
+    model_store=None,
+    categorical_features=None,
+    max_rows=100000,
+    valid_rows=None,
+    stream_update=True,
+    dtype=None,
+    telemetry_path=None,
+    telemetry_callback=None,
+    domain=None,
+    n_workers=None,
+    workdir=None,
+    adaptive=False,
+    sample_random_state=None,
 ):
-    X_train = pd.DataFrame(X_train)
+    if n_workers is not None and adaptive:
+        raise ValueError("adaptive search is not supported with n_workers")
+    objective = build_objective(
+        X_train,
+        y_train,
+        x_valid=x_valid,
+        y_valid=y_valid,
+        feature_selection=feature_selection,
+        verbose=verbose,
+        keep_predictions=keep_predictions,
+        model_store=model_store,
+        categorical_features=categorical_features,
+        max_rows=max_rows,
+        valid_rows=valid_rows,
+        dtype=dtype,
+        telemetry_path=telemetry_path,
+        telemetry_callback=telemetry_callback,
+        sample_random_state=sample_random_state,
+    )
+    if n_workers is not None:
+        from scikitallstars import distributed
+
+        distributed.search(
+            objective,
+            workdir=workdir,
+            n_workers=n_workers,
+            n_trials=n_trials,
+            timeout=timeout,
+            verbose=verbose,
+        )
+    else:
+        search(
+            objective,
+            timeout=timeout,
+            n_trials=n_trials,
+            show_progress_bar=show_progress_bar,
+            verbose=verbose,
+            adaptive=adaptive,
+        )
+    return finish(objective, stream_update=stream_update, domain=domain, verbose=verbose)
+
+
+def build_objective(
+    X_train,
+    y_train=None,
+    x_valid=None,
+    y_valid=None,
+    feature_selection=True,
+    verbose=True,
+    keep_predictions=False,
+    model_store=None,
+    categorical_features=None,
+    max_rows=100000,
+    valid_rows=None,
+    dtype=None,
+    telemetry_path=None,
+    telemetry_callback=None,
+    sample_random_state=None,
+):
+    source = None
+    if isinstance(X_train, DataSource):
+        source = X_train
+        if valid_rows is None:
+            valid_rows = int(max_rows * 0.1)
+        X_train, x_valid, y_train, y_valid = source.sample(
+            max_rows, valid_rows, random_state=sample_random_state
+        )
+        if verbose:
+            print("sampled", X_train.shape, "rows from", type(source).__name__)
+    elif y_train is None:
+        raise ValueError("y_train is required unless X_train is a DataSource")
+
+    X_train = as_frame(X_train)
     if type(y_train) is not pd.core.series.Series:
         y_train = pd.DataFrame(y_train)[0]
+    memory_saved = 0
+    if dtype is not None:
+        before = nbytes(X_train) + nbytes(x_valid)
+        X_train = downcast(X_train, dtype)
+        x_valid = downcast(x_valid, dtype)
+        memory_saved = before - nbytes(X_train) - nbytes(x_valid)
+        if verbose:
+            print("dtype", dtype, ": saved", memory_saved / 1e6, "MB")
     if feature_selection:
         support = random_forest_feature_selector(X_train, y_train, x_valid=x_valid, y_valid=y_valid)
-        X_train_selected = X_train.iloc[:, support]
+        X_train_selected = select_columns(X_train, support)
         if verbose:
             print(
                 "feature selection: X_train",
@@ -655,12 +723,48 @@ def fit(
         if verbose:
             print("X_train", X_train.shape)
 
-    objective = Objective(X_train, y_train, x_valid=x_valid, y_valid=y_valid, support=support)
+    objective = Objective(
+        X_train,
+        y_train,
+        x_valid=x_valid,
+        y_valid=y_valid,
+        support=support,
+        keep_predictions=keep_predictions,
+        model_store=model_store,
+        categorical_features=categorical_features,
+        dtype=dtype,
+        telemetry_path=telemetry_path,
+        telemetry_callback=telemetry_callback,
+    )
+    objective.memory_saved += memory_saved
+    objective.source = source
+    return objective
+
+
+def search(
+    objective,
+    timeout=100,
+    n_trials=100,
+    show_progress_bar=True,
+    verbose=True,
+    study=None,
+    callbacks=[],
+    adaptive=False,
+):
     optuna.logging.set_verbosity(optuna.logging.WARN)
-    study = optuna.create_study(direction="maximize")
+    if adaptive:
+        n_rounds = len(objective.get_model_names()) + 1
+        return FamilyScheduler(objective).run(
+            timeout=timeout * n_rounds, n_trials=n_trials * n_rounds, verbose=verbose
+        )
+    if study is None:
+        study = optuna.create_study(direction="maximize")
+    callbacks = list(callbacks) + [objective.stop_callback]
 
     model_names = objective.get_model_names()
     for model_name in model_names:
+        if objective.stopped:
+            break
         if verbose:
             print(model_name)
         for _ in range(n_trials):
@@ -671,6 +775,7 @@ def fit(
             timeout=timeout,
             n_trials=n_trials,
             show_progress_bar=show_progress_bar,
+            callbacks=callbacks,
         )
         if verbose:
             if model_name in objective.best_scores.keys():
@@ -680,12 +785,25 @@ def fit(
                         objective.best_models[model_name].model,
                     )
 
-    study.optimize(
-        objective,
-        timeout=timeout,
-        n_trials=n_trials,
-        show_progress_bar=show_progress_bar,
-    )
+    if not objective.stopped:
+        study.optimize(
+            objective,
+            timeout=timeout,
+            n_trials=n_trials,
+            show_progress_bar=show_progress_bar,
+            callbacks=callbacks,
+        )
+    return study
+
+
+def finish(objective, stream_update=True, domain=None, verbose=True):
+    source = getattr(objective, "source", None)
+    if objective.best_model is not None:
+        if source is not None and stream_update and not objective.stopped:
+            stream(objective, source, verbose=verbose)
+
+        if domain is not None:
+            objective.fit_domain(domain)
 
     if verbose:
         print(objective.best_scores)
@@ -693,6 +811,52 @@ def fit(
     return objective
 
 
+def stream(objective, source, verbose=True):
+    model = objective.best_model
+    family = get_family(model.params["model_name"], is_regressor=objective.is_regressor)
+    if not family.partial_fit:
+        return False
+    columns = [
+        column
+        for column, selected in zip(objective.x_train.columns, objective.support)
+        if selected
+    ]
+    n_rows = 0
+    for x_chunk, y_chunk in source.iter_xy(columns=columns, skip_sampled=True):
+        model.update(x_chunk, y_chunk)
+        n_rows += len(x_chunk)
+    if verbose:
+        print("streamed", n_rows, "rows into", model.params["model_name"])
+    if n_rows == 0:
+        return True
+
+    # the search scores no longer describe the streamed model
+    if objective.x_valid is None:
+        objective.score_stale = True
+    else:
+        score = objective.evaluate(
+            model, objective.x_valid, objective.y_valid, support=objective.support
+        )
+        for name, best_model in objective.best_models.items():
+            if best_model is model:
+                objective.best_scores[name] = score
+        objective.best_score = score
+        if verbose:
+            print("validation score after streaming", score)
+    return True
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return int(rss)
+    return int(rss) * 1024
+
+
 def random_forest_feature_selector(
     X_train, y_train, x_valid=None, y_valid=None, timeout=50, n_trials=100, show_progress_bar=False,
     return_importance = False,
@@ -713,6 +877,8 @@ def random_forest_feature_selector(
     )
 
     if sum([1 if x else 0 for x in support]) == len(support):
+        from sklearn.feature_selection import SelectFromModel
+
         selector = SelectFromModel(estimator=objective.best_model.model).fit(
             X_train, y_train
         )
@@ -1,55 +1,296 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from joblib import effective_n_jobs
+from sklearn.base import BaseEstimator
 from sklearn.neighbors import NearestNeighbors
 from sklearn.svm import OneClassSVM
+from sklearn.utils.extmath import row_norms
+
+from scikitallstars.preprocess import as_dense, as_matrix, issparse
 
 
 class KNN:
-    def __init__(self, n_neighbors=5, out=0.05, algorithm="ball_tree"):
+    def __init__(
+        self,
+        n_neighbors=5,
+        out=0.05,
+        algorithm="ball_tree",
+        approximate=False,
+        n_components=16,
+        n_candidates=50,
+        chunk_size=10000,
+        n_jobs=None,
+        random_state=None,
+    ):
         self.n_neighbors = n_neighbors
         self.out = out
         self.model = False
         self.algorithm = algorithm
+        self.approximate = approximate
+        self.n_components = n_components
+        self.n_candidates = n_candidates
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
         self.distances = False
         self.indices = False
         self.threshold = False
         self.len_data = False
 
     def fit(self, X):
-        self.len_data = len(X)
-        self.model = NearestNeighbors(
-            n_neighbors=self.n_neighbors, algorithm=self.algorithm
-        ).fit(X)
-        self.distances, self.indices = self.model.kneighbors(X)
-        self.threshold = sorted(self.distances[:, self.n_neighbors - 1])[
-            int((self.len_data - 1) * (1 - self.out))
-        ]
+        X = as_matrix(X)
+        self.len_data = X.shape[0]
+        if self.approximate:
+            self.model = RandomProjectionIndex(
+                n_neighbors=self.n_neighbors,
+                n_components=self.n_components,
+                n_candidates=self.n_candidates,
+                random_state=self.random_state,
+            ).fit(X)
+        else:
+            self.model = NearestNeighbors(
+                n_neighbors=self.n_neighbors, algorithm=self.algorithm
+            ).fit(X)
+        self.distances, self.indices = self.kneighbors(X)
+        self.threshold = kth_smallest(
+            self.distances[:, self.n_neighbors - 1],
+            int((self.len_data - 1) * (1 - self.out)),
+        )
+        return self
+
+    def kneighbors(self, x):
+        chunks = list(iter_chunks(as_matrix(x), self.chunk_size))
+        with ThreadPoolExecutor(max_workers=effective_n_jobs(self.n_jobs)) as executor:
+            results = list(executor.map(self.model.kneighbors, chunks))
+        return (
+            np.concatenate([distances for distances, indices in results]),
+            np.concatenate([indices for distances, indices in results]),
+        )
 
     def transform(self, x):
-        self.distances, self.indices = self.model.kneighbors(x)
-        return self.distances[:, self.n_neighbors - 1]
+        distances, indices = self.kneighbors(x)
+        return distances[:, self.n_neighbors - 1]
 
     def transform_bin(self, x):
-        self.transform(x)
-        self.Z = self.distances[:, self.n_neighbors - 1]
-        return np.where(self.Z >= self.threshold, 0, 1)
+        return np.where(self.transform(x) >= self.threshold, 0, 1)
+
+
+class RandomProjectionIndex:
+    def __init__(
+        self,
+        n_neighbors=5,
+        n_components=16,
+        n_candidates=50,
+        random_state=None,
+        max_elements=2 ** 22,
+    ):
+        self.n_neighbors = n_neighbors
+        self.n_components = n_components
+        self.n_candidates = n_candidates
+        self.random_state = random_state
+        self.max_elements = max_elements
+
+    def fit(self, X):
+        if issparse(X):
+            self.X = X.tocsr()
+        else:
+            self.X = np.ascontiguousarray(X)
+        self.squared_norms = row_norms(self.X, squared=True)
+        n_components = min(self.n_components, self.X.shape[1])
+        random = np.random.RandomState(self.random_state)
+        self.projection = random.normal(
+            size=(self.X.shape[1], n_components)
+        ) / np.sqrt(n_components)
+        self.index = NearestNeighbors(
+            n_neighbors=min(max(self.n_candidates, self.n_neighbors), self.X.shape[0])
+        ).fit(self.X @ self.projection)
+        return self
+
+    def kneighbors(self, x, chunk_size=1024):
+        x = as_matrix(x)
+        if x.shape[0] > chunk_size:
+            results = [
+                self.kneighbors(chunk, chunk_size)
+                for chunk in iter_chunks(x, chunk_size)
+            ]
+            return (
+                np.concatenate([distances for distances, indices in results]),
+                np.concatenate([indices for distances, indices in results]),
+            )
+        distances, candidates = self.index.kneighbors(x @ self.projection)
+        squared = (
+            self.squared_norms[candidates]
+            + row_norms(x, squared=True)[:, np.newaxis]
+            - 2 * self.candidate_products(x, candidates)
+        )
+        distances = np.sqrt(np.maximum(squared, 0))
+        nearest = np.argpartition(distances, self.n_neighbors - 1, axis=1)[
+            :, : self.n_neighbors
+        ]
+        distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(distances, axis=1)
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(np.take_along_axis(candidates, nearest, axis=1), order, axis=1),
+        )
+
+    def candidate_products(self, x, candidates):
+        if issparse(self.X) or issparse(x):
+            return np.vstack(
+                [
+                    np.ravel(as_dense(self.X[row] @ x[i].T))
+                    for i, row in enumerate(candidates)
+                ]
+            )
+        # X[candidates] holds rows x candidates x features at once, so bound it
+        n_rows = max(1, self.max_elements // (candidates.shape[1] * self.X.shape[1]))
+        return np.concatenate(
+            [
+                np.einsum(
+                    "ijk,ik->ij",
+                    self.X[candidates[start : start + n_rows]],
+                    x[start : start + n_rows],
+                )
+                for start in range(0, x.shape[0], n_rows)
+            ]
+        )
+
+
+def kth_smallest(values, k):
+    return np.partition(np.asarray(values), k)[k]
+
+
+def iter_chunks(x, chunk_size):
+    for start in range(0, x.shape[0], chunk_size):
+        yield x[start : start + chunk_size]
 
 
 class OCSVM:
-    def __init__(self, out=0.05):
-        self.model = OneClassSVM()
+    def __init__(
+        self,
+        out=0.05,
+        approximate=False,
+        n_components=100,
+        kernel_approximation="nystroem",
+        gamma="scale",
+        nu=0.5,
+        chunk_size=10000,
+        random_state=None,
+    ):
         self.out = out
+        self.approximate = approximate
+        self.n_components = n_components
+        self.kernel_approximation = kernel_approximation
+        self.gamma = gamma
+        self.nu = nu
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+        self.model = OneClassSVM(gamma=gamma, nu=nu)
         self.threshold = False
         self.len_data = False
 
     def fit(self, X):
-        self.len_data = len(X)
+        X = as_matrix(X)
+        self.len_data = X.shape[0]
+        if self.approximate:
+            self.model = approximate_ocsvm(
+                X,
+                n_components=self.n_components,
+                kernel_approximation=self.kernel_approximation,
+                gamma=self.gamma,
+                nu=self.nu,
+                random_state=self.random_state,
+            )
         self.model.fit(X)
-        self.threshold = sorted(self.model.decision_function(X))[
-            int((self.len_data - 1) * self.out)
-        ]
+        self.threshold = kth_smallest(
+            self.transform(X), int((self.len_data - 1) * self.out)
+        )
+        return self
 
     def transform(self, x):
-        return self.model.decision_function(x)
+        return np.concatenate(
+            [
+                self.model.decision_function(chunk)
+                for chunk in iter_chunks(as_matrix(x), self.chunk_size)
+            ]
+        )
 
     def transform_bin(self, x):
-        self.Z = self.model.decision_function(x)
-        return np.where(self.Z >= self.threshold, 1, 0)
+        return np.where(self.transform(x) >= self.threshold, 1, 0)
+
+
+def approximate_ocsvm(
+    X,
+    n_components=100,
+    kernel_approximation="nystroem",
+    gamma="scale",
+    nu=0.5,
+    random_state=None,
+):
+    from sklearn.kernel_approximation import Nystroem, RBFSampler
+    from sklearn.pipeline import make_pipeline
+
+    try:
+        from sklearn.linear_model import SGDOneClassSVM
+    except ImportError:
+        # scikit-learn<1.0
+        SGDOneClassSVM = LinearOneClassSVM
+
+    if gamma == "scale":
+        if issparse(X):
+            variance = X.multiply(X).mean() - X.mean() ** 2
+        else:
+            variance = X.var()
+        gamma = 1.0 / (X.shape[1] * variance) if variance > 0 else 1.0
+    elif gamma == "auto":
+        gamma = 1.0 / X.shape[1]
+    n_components = min(n_components, X.shape[0])
+
+    if kernel_approximation == "nystroem":
+        feature_map = Nystroem(
+            gamma=gamma, n_components=n_components, random_state=random_state
+        )
+    elif kernel_approximation == "rbf_sampler":
+        feature_map = RBFSampler(
+            gamma=gamma, n_components=n_components, random_state=random_state
+        )
+    else:
+        raise RuntimeError("unsupported kernel approximation", kernel_approximation)
+    return make_pipeline(
+        feature_map, SGDOneClassSVM(nu=nu, random_state=random_state)
+    )
+
+
+class LinearOneClassSVM(BaseEstimator):
+    # linear one-class SVM by averaged SGD, same objective as SGDOneClassSVM
+    def __init__(self, nu=0.5, max_iter=20, batch_size=256, eta0=0.1, random_state=None):
+        self.nu = nu
+        self.max_iter = max_iter
+        self.batch_size = batch_size
+        self.eta0 = eta0
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        X = as_dense(X)
+        random = np.random.RandomState(self.random_state)
+        n_batches = max(1, X.shape[0] // self.batch_size)
+        w = np.zeros(X.shape[1])
+        rho = 0.0
+        self.coef_ = np.zeros(X.shape[1])
+        self.offset_ = 0.0
+        t = 0
+        for _ in range(self.max_iter):
+            for batch in np.array_split(random.permutation(X.shape[0]), n_batches):
+                t += 1
+                eta = self.eta0 / np.sqrt(t)
+                x = X[batch]
+                violated = x @ w < rho
+                w -= eta * (w - x[violated].sum(axis=0) / (self.nu * len(batch)))
+                rho -= eta * (violated.sum() / (self.nu * len(batch)) - 1.0)
+                self.coef_ += (w - self.coef_) / t
+                self.offset_ += (rho - self.offset_) / t
+        return self
+
+    def decision_function(self, X):
+        return as_dense(X) @ self.coef_ - self.offset_
@@ -0,0 +1,367 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+SIZES = [
+    (1000, 10),
+    (10000, 100),
+    (100000, 1000),
+    (1000000, 10000),
+]
+QUICK_SIZES = [(1000, 10), (10000, 100)]
+
+
+def make_dataset(task, n_samples, n_features, random_state=0, dtype=None):
+    from sklearn.datasets import make_classification, make_regression
+
+    n_informative = min(10, n_features)
+    if task == "classification":
+        x, y = make_classification(
+            n_samples=n_samples,
+            n_features=n_features,
+            n_informative=n_informative,
+            n_redundant=0,
+            random_state=random_state,
+        )
+    elif task == "regression":
+        x, y = make_regression(
+            n_samples=n_samples,
+            n_features=n_features,
+            n_informative=n_informative,
+            random_state=random_state,
+        )
+    else:
+        raise RuntimeError("unsupported task", task)
+    if dtype is not None:
+        x = x.astype(dtype)
+    return pd.DataFrame(x), pd.Series(y)
+
+
+def timed(result, name, function):
+    start = timeit.default_timer()
+    try:
+        value = function()
+    except Exception as e:
+        result["errors"][name] = repr(e)
+        value = None
+    result["seconds"][name] = timeit.default_timer() - start
+    return value
+
+
+def run_case(
+    task,
+    n_samples,
+    n_features,
+    n_trials=10,
+    timeout=60,
+    stacking_trials=5,
+    n_latency=200,
+    random_state=0,
+    dtype=None,
+):
+    import optuna
+
+    from scikitallstars import allstars, predictor, stacking
+
+    optuna.logging.set_verbosity(optuna.logging.WARN)
+    result = {
+        "task": task,
+        "n_samples": n_samples,
+        "n_features": n_features,
+        "n_trials": n_trials,
+        "dtype": dtype,
+        "seconds": {},
+        "errors": {},
+    }
+    x, y = timed(
+        result,
+        "make_dataset",
+        lambda: make_dataset(task, n_samples, n_features, random_state, dtype),
+    )
+
+    support = timed(
+        result,
+        "feature_selection",
+        lambda: allstars.random_forest_feature_selector(
+            x, y, timeout=timeout, n_trials=n_trials
+        ),
+    )
+    if support is None:
+        support = np.array([True] * n_features)
+    result["n_selected"] = int(np.sum(support))
+
+    objective = allstars.Objective(
+        x, y, support=support, split_random_state=random_state, dtype=dtype
+    )
+    study = optuna.create_study(direction="maximize")
+    for model_name in objective.get_model_names():
+        study.enqueue_trial({"model_name": model_name})
+    timed(
+        result,
+        "search",
+        lambda: study.optimize(
+            objective,
+            timeout=timeout,
+            n_trials=n_trials * len(objective.get_model_names()),
+            catch=(Exception,),
+        ),
+    )
+    states = [str(trial.state).split(".")[-1] for trial in study.trials]
+    result["trials"] = {state: states.count(state) for state in set(states)}
+    result["trials_per_second"] = len(study.trials) / max(result["seconds"]["search"], 1e-9)
+    result["fit_seconds"] = {
+        name: float(np.mean(seconds)) for name, seconds in objective.times.items()
+    }
+    result["best_scores"] = {
+        name: float(score) for name, score in objective.best_scores.items()
+    }
+    if objective.best_model is None:
+        result["peak_rss"] = allstars.peak_rss()
+        return result
+
+    timed(
+        result,
+        "stacking",
+        lambda: stacking.get_best_stacking(
+            objective,
+            x,
+            y,
+            timeout=timeout,
+            n_trials=stacking_trials,
+            show_progress_bar=False,
+        ),
+    )
+
+    model = predictor.export(objective)
+    result["latency"] = {}
+    for batch_size in [1, 100]:
+        result["latency"][str(batch_size)] = timed(
+            result,
+            "latency_{}".format(batch_size),
+            lambda: predictor.latency(
+                model.predict, x.values, n_repeats=n_latency, batch_size=batch_size
+            ),
+        )
+    result["peak_rss"] = allstars.peak_rss()
+    return result
+
+
+def run_isolated(task, n_samples, n_features, **kwargs):
+    command = [
+        sys.executable,
+        "-m",
+        "scikitallstars.benchmark",
+        "--case",
+        "{}x{}".format(n_samples, n_features),
+        "--task",
+        task,
+    ]
+    for key, value in kwargs.items():
+        if value is not None:
+            command += ["--" + key.replace("_", "-"), str(value)]
+    process = subprocess.run(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+    if process.returncode != 0:
+        return {
+            "task": task,
+            "n_samples": n_samples,
+            "n_features": n_features,
+            "errors": {"process": process.stderr[-2000:]},
+        }
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    import sklearn
+
+    try:
+        from importlib.metadata import version
+
+        scikitallstars_version = version("scikitallstars")
+    except Exception:
+        scikitallstars_version = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "scikitallstars": scikitallstars_version,
+    }
+
+
+def run(
+    sizes=QUICK_SIZES,
+    tasks=["classification", "regression"],
+    isolated=True,
+    verbose=True,
+    **kwargs
+):
+    results = []
+    for task in tasks:
+        for n_samples, n_features in sizes:
+            if verbose:
+                print(task, n_samples, n_features, file=sys.stderr)
+            if isolated:
+                results.append(run_isolated(task, n_samples, n_features, **kwargs))
+            else:
+                results.append(run_case(task, n_samples, n_features, **kwargs))
+    return {"environment": environment(), "results": results}
+
+
+def compare(baseline, current, keys=["search", "feature_selection", "stacking"]):
+    rows = []
+    for old in baseline["results"]:
+        for new in current["results"]:
+            if [old["task"], old["n_samples"], old["n_features"]] != [
+                new["task"],
+                new["n_samples"],
+                new["n_features"],
+            ]:
+                continue
+            row = {
+                "task": new["task"],
+                "n_samples": new["n_samples"],
+                "n_features": new["n_features"],
+            }
+            for key in keys:
+                if key in old.get("seconds", {}) and key in new.get("seconds", {}):
+                    row[key] = new["seconds"][key] / max(old["seconds"][key], 1e-9)
+            if "peak_rss" in old and "peak_rss" in new:
+                row["peak_rss"] = new["peak_rss"] / max(old["peak_rss"], 1)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def make_domain_dataset(n_samples, n_features, out=0.05, random_state=0):
+    random = np.random.RandomState(random_state)
+    n_outliers = max(int(n_samples * out), 1)
+    inliers = random.normal(size=(n_samples, n_features))
+    outliers = random.normal(scale=2, size=(n_outliers, n_features))
+    x_test = np.vstack([random.normal(size=(n_samples, n_features)), outliers])
+    y_test = np.hstack([np.ones(n_samples), np.zeros(n_outliers)])
+    return inliers, x_test, y_test
+
+
+def domain_case(mode, n_samples, n_features, out=0.05, random_state=0, **kwargs):
+    from sklearn.metrics import roc_auc_score
+
+    from scikitallstars import avd
+
+    x_train, x_test, y_test = make_domain_dataset(
+        n_samples, n_features, out=out, random_state=random_state
+    )
+    if mode == "ocsvm":
+        detector = avd.OCSVM(out=out, **kwargs)
+    elif mode == "ocsvm_approximate":
+        detector = avd.OCSVM(out=out, approximate=True, random_state=random_state, **kwargs)
+    elif mode == "knn":
+        detector = avd.KNN(out=out, **kwargs)
+    elif mode == "knn_approximate":
+        detector = avd.KNN(out=out, approximate=True, random_state=random_state, **kwargs)
+    else:
+        raise RuntimeError("unsupported domain mode", mode)
+
+    result = {"mode": mode, "n_samples": n_samples, "n_features": n_features, "seconds": {}, "errors": {}}
+    timed(result, "fit", lambda: detector.fit(x_train))
+    if len(result["errors"]) > 0:
+        return result
+    score = timed(result, "transform", lambda: detector.transform(x_test))
+    if mode.startswith("knn"):
+        score = -score
+    result["auc"] = float(roc_auc_score(y_test, score))
+    result["in_domain_rate"] = float(np.mean(detector.transform_bin(x_test)[y_test == 1]))
+    return result
+
+
+def domain_benchmark(
+    sizes=[1000, 5000, 20000],
+    n_features=10,
+    modes=["ocsvm", "ocsvm_approximate"],
+    out=0.05,
+    random_state=0,
+):
+    return {
+        "environment": environment(),
+        "results": [
+            domain_case(mode, n_samples, n_features, out=out, random_state=random_state)
+            for n_samples in sizes
+            for mode in modes
+        ],
+    }
+
+
+def parse_size(text):
+    n_samples, n_features = text.lower().split("x")
+    return int(float(n_samples)), int(float(n_features))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scikitallstars.benchmark")
+    parser.add_argument("--sizes", default=None, help="e.g. 1e3x10,1e4x100")
+    parser.add_argument("--full", action="store_true", help="1e3x10 up to 1e6x1e4")
+    parser.add_argument("--task", default="classification,regression")
+    parser.add_argument("--n-trials", type=int, default=10)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--stacking-trials", type=int, default=5)
+    parser.add_argument("--n-latency", type=int, default=200)
+    parser.add_argument("--dtype", default=None)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare with")
+    parser.add_argument("--in-process", action="store_true")
+    parser.add_argument("--domain", action="store_true", help="OCSVM/KNN domain models")
+    parser.add_argument("--domain-modes", default="ocsvm,ocsvm_approximate")
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    kwargs = {
+        "n_trials": args.n_trials,
+        "timeout": args.timeout,
+        "stacking_trials": args.stacking_trials,
+        "n_latency": args.n_latency,
+        "dtype": args.dtype,
+    }
+    if args.case is not None:
+        n_samples, n_features = parse_size(args.case)
+        print(json.dumps(run_case(args.task, n_samples, n_features, **kwargs)))
+        return
+
+    if args.sizes is not None:
+        sizes = [parse_size(size) for size in args.sizes.split(",")]
+    elif args.full:
+        sizes = SIZES
+    else:
+        sizes = QUICK_SIZES
+    if args.domain:
+        report = domain_benchmark(
+            sizes=[n_samples for n_samples, n_features in sizes],
+            n_features=sizes[0][1],
+            modes=args.domain_modes.split(","),
+        )
+    else:
+        report = run(
+            sizes=sizes,
+            tasks=args.task.split(","),
+            isolated=not args.in_process,
+            **kwargs
+        )
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
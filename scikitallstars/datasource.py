@@ -0,0 +1,125 @@
+import abc
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class DataSource(abc.ABC):
+    def __init__(self, target, chunksize=100000):
+        self.target = target
+        self.chunksize = chunksize
+        self.sampled_rows = None
+
+    @abc.abstractmethod
+    def columns(self):
+        pass
+
+    @abc.abstractmethod
+    def iter_chunks(self, columns=None):
+        pass
+
+    def features(self):
+        return [column for column in self.columns() if column != self.target]
+
+    def iter_xy(self, columns=None, skip_sampled=False):
+        if columns is None:
+            columns = self.features()
+        offset = 0
+        for chunk in self.iter_chunks(columns=list(columns) + [self.target]):
+            rows = np.arange(offset, offset + len(chunk))
+            offset += len(chunk)
+            if skip_sampled and self.sampled_rows is not None:
+                chunk = chunk[~np.isin(rows, self.sampled_rows)]
+                if len(chunk) == 0:
+                    continue
+            yield chunk[list(columns)], chunk[self.target]
+
+    def sample(self, n_train, n_valid=0, columns=None, random_state=None):
+        random = np.random.RandomState(random_state)
+        if columns is None:
+            columns = self.features()
+        columns = list(columns) + [self.target]
+        n_rows = n_train + n_valid
+        reservoir = None
+        keys = np.array([])
+        rows = np.array([], dtype=np.int64)
+        offset = 0
+        for chunk in self.iter_chunks(columns=columns):
+            chunk = chunk[columns].reset_index(drop=True)
+            chunk_keys = random.random_sample(len(chunk))
+            chunk_rows = np.arange(offset, offset + len(chunk))
+            offset += len(chunk)
+            if reservoir is not None:
+                chunk = pd.concat([reservoir, chunk], ignore_index=True)
+                chunk_keys = np.concatenate([keys, chunk_keys])
+                chunk_rows = np.concatenate([rows, chunk_rows])
+            if len(chunk) > n_rows:
+                kept = np.argpartition(chunk_keys, n_rows - 1)[:n_rows]
+                chunk = chunk.iloc[kept].reset_index(drop=True)
+                chunk_keys = chunk_keys[kept]
+                chunk_rows = chunk_rows[kept]
+            reservoir = chunk
+            keys = chunk_keys
+            rows = chunk_rows
+
+        # row numbers of the sample, so streaming can skip what search has seen
+        self.sampled_rows = np.sort(rows)
+        order = np.argsort(keys)
+        valid = reservoir.iloc[order[:n_valid]].reset_index(drop=True)
+        train = reservoir.iloc[order[n_valid:]].reset_index(drop=True)
+        x_valid = None
+        y_valid = None
+        if n_valid > 0:
+            x_valid = valid.drop(columns=[self.target])
+            y_valid = valid[self.target]
+        return (
+            train.drop(columns=[self.target]),
+            x_valid,
+            train[self.target],
+            y_valid,
+        )
+
+
+class CSVSource(DataSource):
+    def __init__(self, path, target, chunksize=100000, **read_csv_kwargs):
+        super(CSVSource, self).__init__(target, chunksize=chunksize)
+        self.path = path
+        self.read_csv_kwargs = read_csv_kwargs
+
+    def columns(self):
+        return list(pd.read_csv(self.path, nrows=0, **self.read_csv_kwargs).columns)
+
+    def iter_chunks(self, columns=None):
+        for chunk in pd.read_csv(
+            self.path, usecols=columns, chunksize=self.chunksize, **self.read_csv_kwargs
+        ):
+            yield chunk
+
+
+class ParquetSource(DataSource):
+    def __init__(self, path, target, chunksize=100000):
+        super(ParquetSource, self).__init__(target, chunksize=chunksize)
+        if not isinstance(path, str):
+            self.paths = list(path)
+        elif os.path.isdir(path):
+            self.paths = sorted(
+                glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True)
+            )
+        else:
+            self.paths = [path]
+
+    def columns(self):
+        import pyarrow.parquet as pq
+
+        return list(pq.ParquetFile(self.paths[0]).schema_arrow.names)
+
+    def iter_chunks(self, columns=None):
+        import pyarrow.parquet as pq
+
+        for path in self.paths:
+            for batch in pq.ParquetFile(path).iter_batches(
+                batch_size=self.chunksize, columns=columns
+            ):
+                yield batch.to_pandas()
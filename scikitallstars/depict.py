@@ -1,24 +1,51 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from sklearn.metrics import (auc, confusion_matrix, precision_recall_curve,
                              r2_score, roc_curve)
 
+from scikitallstars.evaluation import evaluate
+from scikitallstars.lazy import LazyModule
+from scikitallstars.preprocess import as_frame, select_columns
 
-def best_scores(allstars_model):
+plt = LazyModule("matplotlib.pyplot")
+
+
+# every chart draws into fig when given one (e.g. by report), else into a pyplot figure
+def new_figure(fig, figsize):
+    if fig is None:
+        return plt.figure(figsize=figsize)
+    fig.set_size_inches(*figsize)
+    return fig
+
+
+def show(fig, shown):
+    if shown:
+        plt.show()
+    return fig
+
+
+def best_scores(allstars_model, fig=None):
+    shown = fig is None
     keys = list(allstars_model.best_scores.keys())
     values = list(allstars_model.best_scores.values())
-    plt.figure(figsize=(6, int(len(keys) / 3)))
-    plt.title("Best scores")
-    plt.barh([k for k in reversed(keys)], [v for v in reversed(values)])
-    plt.grid()
-    plt.show()
+    fig = new_figure(fig, (6, int(len(keys) / 3) + 1))
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title("Best scores")
+    ax.barh([k for k in reversed(keys)], [v for v in reversed(values)])
+    ax.grid()
+    return show(fig, shown)
 
 
-def training_summary(objective):
-    fig, axes = plt.subplots(nrows=1, ncols=4, figsize=(16, 8))
+def training_summary(objective, fig=None):
+    shown = fig is None
+    fig = new_figure(fig, (16, 8))
+    axes = fig.subplots(nrows=1, ncols=4)
 
-    names = [n for n in reversed(list(objective.get_model_names()))]
+    names = [
+        n
+        for n in reversed(list(objective.get_model_names()))
+        if n in objective.scores.keys()
+    ]
 
     score_means = []
     score_stds = []
@@ -50,38 +77,45 @@ def training_summary(objective):
     axes[3].set_xlabel("total calculation time (seconds)")
     axes[3].grid()
     axes[3].yaxis.set_visible(False)
-    plt.show()
+    return show(fig, shown)
 
 
-def feature_importances(allstars_model):
+def feature_importances(allstars_model, fig=None):
+    shown = fig is None
+    columns = select_columns(as_frame(allstars_model.x_train), allstars_model.support)
     barh_dict = {}
     for key, value in zip(
-        list(allstars_model.x_train.iloc[:, allstars_model.support].columns),
+        list(getattr(columns, "columns", range(columns.shape[1]))),
         allstars_model.best_models["RandomForest"].model.feature_importances_,
     ):
         barh_dict[key] = value
 
     keys = list(barh_dict.keys())
-    values = barh_dict.values()
-
-    plt.figure(figsize=(6, int(len(keys) / 3) + 1))
-    plt.title("Feature importances in RF")
-    plt.barh(keys, values)
-    plt.grid()
-    plt.show()
-
-
-def model_importances(stacking_model):
-    plt.title("Model importances in stacking")
-    plt.barh(
-        [k for k in reversed(list(stacking_model.best_model.named_estimators_.keys()))],
+    values = list(barh_dict.values())
+
+    fig = new_figure(fig, (6, int(len(keys) / 3) + 1))
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title("Feature importances in RF")
+    ax.barh(keys, values)
+    ax.grid()
+    return show(fig, shown)
+
+
+def model_importances(stacking_model, fig=None):
+    shown = fig is None
+    names = list(stacking_model.best_model.named_estimators_.keys())
+    fig = new_figure(fig, (6, int(len(names) / 3) + 1))
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title("Model importances in stacking")
+    ax.barh(
+        [k for k in reversed(names)],
         [v for v in reversed(stacking_model.best_model.final_estimator_.feature_importances_)],
     )
-    plt.grid()
-    plt.show()
+    ax.grid()
+    return show(fig, shown)
 
 
-def metrics(model, X_train, y_train, X_test=None, y_test=None):
+def metrics(model, X_train, y_train, X_test=None, y_test=None, fig=None):
     X_train = pd.DataFrame(X_train)
     if type(y_train) is not pd.core.series.Series:
         y_train = pd.DataFrame(y_train)[0]
@@ -91,22 +125,23 @@ def metrics(model, X_train, y_train, X_test=None, y_test=None):
         y_test = pd.DataFrame(y_test)
     if hasattr(model, "is_regressor"):
         if model.is_regressor:
-            regression_metrics(model, X_train, y_train, X_test, y_test)
+            return regression_metrics(model, X_train, y_train, X_test, y_test, fig=fig)
         else:
-            classification_metrics(model, X_train, y_train, X_test, y_test)
+            return classification_metrics(model, X_train, y_train, X_test, y_test, fig=fig)
     elif hasattr(model, "predict_proba") or hasattr(model, "decision_function"):
-        classification_metrics(model, X_train, y_train, X_test, y_test)
+        return classification_metrics(model, X_train, y_train, X_test, y_test, fig=fig)
     else:
-        regression_metrics(model, X_train, y_train, X_test, y_test)
-
+        return regression_metrics(model, X_train, y_train, X_test, y_test, fig=fig)
 
-def regression_metrics(model, X_train, y_train, X_test=None, y_test=None):
 
+def regression_metrics(model, X_train, y_train, X_test=None, y_test=None, fig=None):
+    shown = fig is None
+    fig = new_figure(fig, (8, 4))
     if X_test is None:
-        fig, axes = plt.subplots(nrows=1, ncols=1, figsize=(8, 4))
+        axes = fig.subplots(nrows=1, ncols=1)
         ax = axes
     else:
-        fig, axes = plt.subplots(nrows=1, ncols=2, figsize=(8, 4))
+        axes = fig.subplots(nrows=1, ncols=2)
         ax = axes[0]
 
     y_pred = model.predict(X_train)
@@ -145,30 +180,34 @@ def regression_metrics(model, X_train, y_train, X_test=None, y_test=None):
         )
         axes[1].set_xlabel("Real")
         axes[1].set_ylabel("Predicted")
-    plt.show()
+    return show(fig, shown)
 
 
-def classification_metrics(model, X_train, y_train, X_test, y_test):
+def classification_metrics(model, X_train, y_train, X_test, y_test, fig=None):
+    shown = fig is None
     if model.support is not None:
         X_train = X_train.iloc[:, model.support]
         X_test = X_test.iloc[:, model.support]
     if hasattr(model, "best_model"):
-        if hasattr(model.best_model, "model"):
-            model = model.best_model.model
-        else:
-            model = model.best_model
-    fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(4 * 2, 4 * 3))
+        model = model.best_model
+    fig = new_figure(fig, (4 * 2, 4 * 3))
+    axes = fig.subplots(nrows=3, ncols=2)
     i = 0
     for XX, YY, name in [
         [X_train, y_train, "Training data"],
         [X_test, y_test, "Test data"],
     ]:
-        if hasattr(model, "predict_proba"):
+        if hasattr(model, "model"):
+            if hasattr(model.model, "predict_proba"):
+                probas = model.predict_proba(XX)
+            else:
+                probas = np.array(
+                    [[x, x] for x in model.model.decision_function(model.transform(XX))]
+                )
+        elif hasattr(model, "predict_proba"):
             probas = model.predict_proba(XX)
-        elif hasattr(model, "decision_function"):
-            probas = np.array([[x, x] for x in model.decision_function(XX)])
         else:
-            probas = np.array([[x, x] for x in model.model.decision_function(XX)])
+            probas = np.array([[x, x] for x in model.decision_function(XX)])
 
         fpr, tpr, thresholds = roc_curve(YY, probas[:, 1])
         roc_auc = auc(fpr, tpr)
@@ -231,42 +270,25 @@ def classification_metrics(model, X_train, y_train, X_test, y_test):
             horizontalalignment="right",
         )
         i += 1
-    plt.show()
+    return show(fig, shown)
 
 
-def all_classification_metrics(objective, X_test, y_test):
-    fig, axes = plt.subplots(
-        nrows=3,
-        ncols=len(objective.best_models.keys()),
-        figsize=(4 * len(objective.best_models.keys()), 4 * 3),
-    )
+def all_classification_metrics(
+    objective, X_test, y_test, evaluation=None, n_jobs=None, fig=None
+):
+    shown = fig is None
+    if evaluation is None:
+        evaluation = evaluate(objective, X_test, y_test, n_jobs=n_jobs)
+    fig = new_figure(fig, (4 * len(evaluation.names), 4 * 3))
+    axes = fig.subplots(nrows=3, ncols=len(evaluation.names), squeeze=False)
     i = 0
-    for name in objective.best_models.keys():
-        model = objective.best_models[name]
-        if hasattr(model.model, "predict_proba"):
-            probas = model.predict_proba(X_test.iloc[:, objective.support])
-        else:
-            probas = np.array(
-                [
-                    [x, x]
-                    for x in model.model.decision_function(
-                        X_test.iloc[:, objective.support]
-                    )
-                ]
-            )
-
-        fpr, tpr, thresholds = roc_curve(y_test, probas[:, 1])
-        roc_auc = auc(fpr, tpr)
-        precision, recall, thresholds = precision_recall_curve(y_test, probas[:, 1])
-        area = auc(recall, precision)
-        matrix = confusion_matrix(
-            model.predict(X_test.iloc[:, objective.support]), y_test
-        )
-        TN = matrix[0][0]
-        FP = matrix[1][0]
-        FN = matrix[0][1]
-        TP = matrix[1][1]
-        data = [TP, FN, FP, TN]
+    for name in evaluation.names:
+        curves = evaluation.curves[name]
+        fpr, tpr = curves["fpr"], curves["tpr"]
+        precision, recall = curves["precision"], curves["recall"]
+        roc_auc = evaluation.value(name, "roc_auc")
+        area = evaluation.value(name, "pr_auc")
+        data = [evaluation.value(name, key) for key in ["TP", "FN", "FP", "TN"]]
         axes[0][i].set_title(name)
         axes[0][i].pie(
             data,
@@ -280,7 +302,7 @@ def all_classification_metrics(objective, X_test, y_test):
         axes[0][i].text(
             1.0 - 0.5,
             0.0 + 0.7,
-            ("%.3f" % ((TN + TP) / (TN + TP + FN + FP))).lstrip("0"),
+            ("%.3f" % evaluation.value(name, "accuracy")).lstrip("0"),
             size=20,
             horizontalalignment="right",
         )
@@ -314,43 +336,56 @@ def all_classification_metrics(objective, X_test, y_test):
             horizontalalignment="right",
         )
         i += 1
-    plt.show()
-
-
-def all_regression_metrics(objective, X_test, y_test):
-    fig, axes = plt.subplots(
-        nrows=1,
-        ncols=len(objective.best_models.keys()),
-        figsize=(4 * len(objective.best_models.keys()), 4),
-    )
+    return show(fig, shown)
+
+
+def all_regression_metrics(
+    objective,
+    X_test,
+    y_test,
+    evaluation=None,
+    n_jobs=None,
+    fig=None,
+    max_points=100000,
+    gridsize=50,
+):
+    shown = fig is None
+    if evaluation is None:
+        evaluation = evaluate(objective, X_test, y_test, n_jobs=n_jobs)
+    fig = new_figure(fig, (4 * len(evaluation.names), 4))
+    axes = fig.subplots(nrows=1, ncols=len(evaluation.names), squeeze=False)
+    y_test = evaluation.y
     i = 0
-    for name in objective.best_models.keys():
-        y_pred = objective.best_models[name].predict(X_test, support=objective.support)
-        score = r2_score(np.array(y_pred).ravel(), np.array(y_test).ravel())
-        axes[i].set_title(name)
-        axes[i].scatter(y_test, y_pred, alpha=0.5)
+    for name in evaluation.names:
+        y_pred = evaluation.outputs[name]["pred"]
+        score = evaluation.value(name, "r2")
+        axes[0][i].set_title(name)
+        if len(y_test) > max_points:
+            axes[0][i].hexbin(y_test, y_pred, gridsize=gridsize, mincnt=1, bins="log")
+        else:
+            axes[0][i].scatter(y_test, y_pred, alpha=0.5)
         y_min = min(y_test.min(), y_pred.min())
         y_max = min(y_test.max(), y_pred.max())
-        axes[i].plot([y_min, y_max], [y_min, y_max])
-        axes[i].text(
+        axes[0][i].plot([y_min, y_max], [y_min, y_max])
+        axes[0][i].text(
             y_max - 0.3,
             y_min + 0.3,
             ("%.3f" % score).lstrip("0"),
             size=15,
             horizontalalignment="right",
         )
-        axes[i].set_xlabel("Real")
+        axes[0][i].set_xlabel("Real")
         if i == 0:
-            axes[i].set_ylabel("Predicted")
+            axes[0][i].set_ylabel("Predicted")
         i += 1
-    plt.show()
+    return show(fig, shown)
 
 
-def all_metrics(objective, X_test, y_test):
-    X_test = pd.DataFrame(X_test)
-    if type(y_test) is not pd.core.series.Series:
-        y_test = pd.DataFrame(y_test)[0]
-    if objective.is_regressor:
-        all_regression_metrics(objective, X_test, y_test)
-    else:
-        all_classification_metrics(objective, X_test, y_test)
+def all_metrics(objective, X_test, y_test, plot=True, n_jobs=None):
+    evaluation = evaluate(objective, X_test, y_test, n_jobs=n_jobs)
+    if plot:
+        if objective.is_regressor:
+            all_regression_metrics(objective, X_test, y_test, evaluation=evaluation)
+        else:
+            all_classification_metrics(objective, X_test, y_test, evaluation=evaluation)
+    return evaluation.table
@@ -0,0 +1,317 @@
+import argparse
+import glob
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+import joblib
+
+from scikitallstars import allstars
+from scikitallstars.lazy import LazyModule
+from scikitallstars.model_store import ModelStore
+
+optuna = LazyModule("optuna")
+
+STUDY_NAME = "scikitallstars"
+
+# Objective attributes holding data, results or callbacks rather than settings
+STATE = [
+    "x_train",
+    "y_train",
+    "x_valid",
+    "y_valid",
+    "support",
+    "categorical_features",
+    "dtype",
+    "best_scores",
+    "best_params",
+    "best_models",
+    "best_score",
+    "best_model",
+    "valid_predictions",
+    "model_store",
+    "y_valid_kept",
+    "valid_classes",
+    "times",
+    "scores",
+    "neighbor_graphs",
+    "telemetry",
+    "telemetry_path",
+    "telemetry_callback",
+    "last_trial_end",
+    "stopped",
+    "domain",
+    "domain_model",
+    "source",
+    "study",
+    "upcast_warned",
+    "memory_saved",
+    "score_stale",
+    "updated",
+    "update_scores",
+    "needs_refit",
+]
+
+
+def data_path(workdir):
+    return os.path.join(workdir, "data.joblib")
+
+
+def journal_path(workdir):
+    return os.path.join(workdir, "journal.log")
+
+
+def artifact_dir(workdir):
+    return os.path.join(workdir, "artifacts")
+
+
+def journal_backend():
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:
+        try:
+            from optuna.storages import JournalFileStorage as JournalFileBackend
+        except ImportError:
+            return None
+    return JournalFileBackend
+
+
+def journal_storage(path):
+    backend = journal_backend()
+    if backend is None:
+        raise RuntimeError("unsupported optuna version (journal storage)", optuna.__version__)
+    return optuna.storages.JournalStorage(backend(path))
+
+
+def load_study(workdir):
+    return optuna.load_study(
+        study_name=STUDY_NAME, storage=journal_storage(journal_path(workdir))
+    )
+
+
+def settings(objective):
+    return {
+        name: value
+        for name, value in vars(objective).items()
+        if name not in STATE and not callable(value)
+    }
+
+
+def store_settings(model_store):
+    if model_store is None:
+        return None
+    return {
+        "k": model_store.k,
+        "spill_dir": model_store.spill_dir,
+        "spill_models": model_store.spill_models,
+        "max_bytes": model_store.max_bytes,
+        "compress": model_store.compress,
+    }
+
+
+def build_objective(data, telemetry_path=None):
+    model_store = None
+    if data["model_store"] is not None:
+        model_store = ModelStore(**data["model_store"])
+    objective = allstars.Objective(
+        data["x_train"],
+        data["y_train"],
+        x_valid=data["x_valid"],
+        y_valid=data["y_valid"],
+        support=data["support"],
+        keep_predictions=data["settings"]["keep_predictions"],
+        model_store=model_store,
+        categorical_features=data["categorical_features"],
+        dtype=data["dtype"],
+        telemetry_path=telemetry_path,
+    )
+    for name, value in data["settings"].items():
+        setattr(objective, name, value)
+    return objective
+
+
+def prepare(objective, workdir, n_trials=100, timeout=100):
+    os.makedirs(artifact_dir(workdir), exist_ok=True)
+    model_names = list(objective.get_model_names())
+    joblib.dump(
+        {
+            "x_train": objective.x_train,
+            "y_train": objective.y_train,
+            "x_valid": objective.x_valid,
+            "y_valid": objective.y_valid,
+            "support": objective.support,
+            "categorical_features": objective.categorical_features,
+            "dtype": objective.dtype,
+            "settings": settings(objective),
+            "model_store": store_settings(objective.model_store),
+            "total_trials": n_trials * (len(model_names) + 1),
+            "timeout": timeout * (len(model_names) + 1),
+        },
+        data_path(workdir),
+    )
+    optuna.logging.set_verbosity(optuna.logging.WARN)
+    study = optuna.create_study(
+        study_name=STUDY_NAME,
+        storage=journal_storage(journal_path(workdir)),
+        direction="maximize",
+        load_if_exists=True,
+    )
+    if len(study.trials) == 0:
+        for model_name in model_names:
+            for _ in range(n_trials):
+                study.enqueue_trial({"model_name": model_name})
+    return study
+
+
+def max_trials_callback(n_trials):
+    def callback(study, trial):
+        if len(study.get_trials(deepcopy=False)) >= n_trials:
+            study.stop()
+
+    return callback
+
+
+def work(workdir, worker_id=None, timeout=None, verbose=False):
+    if worker_id is None:
+        worker_id = "{}-{}".format(socket.gethostname(), os.getpid())
+    data = joblib.load(data_path(workdir))
+    objective = build_objective(
+        data,
+        telemetry_path=os.path.join(artifact_dir(workdir), "worker-{}.jsonl".format(worker_id)),
+    )
+    if timeout is None:
+        timeout = data["timeout"]
+
+    optuna.logging.set_verbosity(optuna.logging.WARN)
+    study = load_study(workdir)
+    if len(study.get_trials(deepcopy=False)) < data["total_trials"]:
+        study.optimize(
+            objective,
+            timeout=timeout,
+            callbacks=[objective.stop_callback, max_trials_callback(data["total_trials"])],
+            catch=(Exception,),
+        )
+    filename = os.path.join(artifact_dir(workdir), "worker-{}.joblib".format(worker_id))
+    joblib.dump(
+        {
+            "worker_id": worker_id,
+            "best_scores": objective.best_scores,
+            "best_models": objective.best_models,
+            "scores": objective.scores,
+            "times": objective.times,
+            "telemetry": objective.telemetry,
+            "valid_predictions": objective.valid_predictions,
+            "y_valid_kept": objective.y_valid_kept,
+            "valid_classes": objective.valid_classes,
+            "model_store": objective.model_store,
+        },
+        filename + ".tmp",
+    )
+    os.replace(filename + ".tmp", filename)
+    if verbose:
+        print("worker", worker_id, objective.best_scores)
+    return filename
+
+
+def run_local(workdir, n_workers=2, timeout=None, verbose=True):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join([root] + [p for p in [env.get("PYTHONPATH")] if p])
+    command = [sys.executable, "-m", "scikitallstars.distributed", workdir]
+    if timeout is not None:
+        command += ["--timeout", str(timeout)]
+    output = None if verbose else subprocess.DEVNULL
+    processes = [
+        subprocess.Popen(
+            command + ["--worker-id", "local-{}".format(i)],
+            env=env,
+            stdout=output,
+            stderr=output,
+        )
+        for i in range(n_workers)
+    ]
+    codes = [process.wait() for process in processes]
+    if verbose and any(codes):
+        print("worker exit codes", codes)
+    return codes
+
+
+def merge(workdir, objective=None, verbose=True):
+    filenames = sorted(glob.glob(os.path.join(artifact_dir(workdir), "worker-*.joblib")))
+    if len(filenames) == 0:
+        raise RuntimeError("no worker artifacts", artifact_dir(workdir))
+    if objective is None:
+        objective = build_objective(joblib.load(data_path(workdir)))
+
+    for filename in filenames:
+        artifact = joblib.load(filename)
+        for name, score in artifact["best_scores"].items():
+            if name not in artifact["best_models"].keys():
+                # a family whose trials never scored above zero has no model
+                objective.best_scores.setdefault(name, score)
+                continue
+            if (
+                name not in objective.best_models.keys()
+                or score > objective.best_scores[name]
+            ):
+                objective.best_scores[name] = score
+                objective.best_models[name] = artifact["best_models"][name]
+        if objective.keep_predictions and artifact["model_store"] is not None:
+            merge_predictions(objective, artifact)
+        for name, scores in artifact["scores"].items():
+            objective.scores.setdefault(name, []).extend(scores)
+        for name, times in artifact["times"].items():
+            objective.times.setdefault(name, []).extend(times)
+        objective.telemetry.extend(artifact["telemetry"])
+
+    for name, score in objective.best_scores.items():
+        if name not in objective.best_models.keys():
+            continue
+        if objective.best_model is None or score > objective.best_score:
+            objective.best_score = score
+            objective.best_model = objective.best_models[name]
+    objective.study = load_study(workdir)
+    if verbose:
+        print("merged", len(filenames), "workers:", objective.best_scores)
+    return objective
+
+
+def merge_predictions(objective, artifact):
+    model_store = artifact["model_store"]
+    for key in model_store.keys():
+        entry = model_store.entries[key]
+        if objective.model_store.add(
+            key, entry["model_name"], entry["score"], model_store.get(key)
+        ):
+            objective.valid_predictions[key] = artifact["valid_predictions"][key]
+    for evicted in objective.model_store.evicted:
+        objective.valid_predictions.pop(evicted, None)
+    objective.model_store.evicted = []
+    if objective.y_valid_kept is None:
+        objective.y_valid_kept = artifact["y_valid_kept"]
+        objective.valid_classes = artifact["valid_classes"]
+
+
+def search(objective, workdir=None, n_workers=2, n_trials=100, timeout=100, verbose=True):
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix="scikitallstars-")
+    prepare(objective, workdir, n_trials=n_trials, timeout=timeout)
+    if verbose:
+        print("distributed search:", n_workers, "local workers in", workdir)
+    run_local(workdir, n_workers=n_workers, verbose=verbose)
+    return merge(workdir, objective=objective, verbose=verbose)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scikitallstars.distributed")
+    parser.add_argument("workdir", help="shared directory written by distributed.prepare")
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--timeout", type=int, default=None)
+    args = parser.parse_args(argv)
+    work(args.workdir, worker_id=args.worker_id, timeout=args.timeout, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
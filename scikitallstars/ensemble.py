@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score, r2_score
+
+
+class EnsembleSelection:
+    def __init__(self, objective, n_iter=50, verbose=True):
+        self.objective = objective
+        self.n_iter = n_iter
+        self.verbose = verbose
+        self.support = objective.support
+        self.is_regressor = objective.is_regressor
+        self.keys = []
+        self.weights = None
+        self.history = []
+        self.best_score = None
+        self.best_model = None
+
+    def fit(self):
+        self.keys = sorted(self.objective.valid_predictions.keys())
+        if len(self.keys) == 0:
+            raise RuntimeError("no validation predictions, fit with keep_predictions=True")
+        predictions = np.column_stack(
+            [self.objective.valid_predictions[key] for key in self.keys]
+        )
+        y = self.objective.y_valid_kept
+        classes = None
+        if not self.is_regressor:
+            classes = self.objective.valid_classes
+            y = np.where(y == classes[1], 1, 0)
+
+        counts = np.zeros(len(self.keys))
+        best_counts = counts
+        current = np.zeros(len(y), dtype=predictions.dtype)
+        for i in range(self.n_iter):
+            candidates = (current[:, np.newaxis] * i + predictions) / (i + 1)
+            scores = self.score_matrix(candidates, y)
+            best = int(np.argmax(scores))
+            counts[best] += 1
+            current = candidates[:, best]
+            self.history.append(float(scores[best]))
+            if self.best_score is None or self.best_score < scores[best]:
+                self.best_score = float(scores[best])
+                best_counts = counts.copy()
+
+        self.weights = best_counts / best_counts.sum()
+        members = [
+            (self.objective.model_store.get(key), weight)
+            for key, weight in zip(self.keys, self.weights)
+            if weight > 0
+        ]
+        self.best_model = EnsembleModel(
+            members,
+            support=self.support,
+            is_regressor=self.is_regressor,
+            classes=classes,
+            classification_metrics=self.objective.classification_metrics,
+        )
+        if self.verbose:
+            print(
+                "ensemble",
+                [(model.params["model_name"], float(weight)) for model, weight in members],
+                self.best_score,
+            )
+        return self
+
+    def score_matrix(self, candidates, y):
+        if self.is_regressor:
+            residual = ((candidates - y[:, np.newaxis]) ** 2).sum(axis=0)
+            return 1 - residual / ((y - y.mean()) ** 2).sum()
+        pred = candidates >= 0.5
+        if self.objective.classification_metrics == "f1_score":
+            positive = (y == 1)[:, np.newaxis]
+            tp = (pred & positive).sum(axis=0)
+            fp = (pred & ~positive).sum(axis=0)
+            fn = (~pred & positive).sum(axis=0)
+            return 2 * tp / np.maximum(2 * tp + fp + fn, 1)
+        return (pred == (y == 1)[:, np.newaxis]).mean(axis=0)
+
+    def predict(self, X):
+        return self.best_model.predict(X)
+
+    def score(self, X, Y):
+        return self.best_model.score(X, Y)
+
+
+class EnsembleModel:
+    def __init__(
+        self,
+        members,
+        support=None,
+        is_regressor=True,
+        classes=None,
+        classification_metrics="f1_score",
+    ):
+        self.members = members
+        self.support = support
+        self.is_regressor = is_regressor
+        self.classes_ = classes
+        self.classification_metrics = classification_metrics
+
+    def _select(self, x):
+        if self.support is not None and len(self.support) == x.shape[1]:
+            return pd.DataFrame(x).iloc[:, self.support]
+        return x
+
+    def _average(self, x):
+        x = self._select(x)
+        average = 0
+        for model, weight in self.members:
+            if self.is_regressor:
+                pred = model.predict(x)
+            elif hasattr(model.model, "predict_proba"):
+                pred = model.predict_proba(x)[:, 1]
+            else:
+                pred = np.where(model.predict(x) == self.classes_[1], 1, 0)
+            average = average + weight * np.ravel(pred)
+        return average
+
+    def predict(self, x):
+        average = self._average(x)
+        if self.is_regressor:
+            return average
+        return np.asarray(self.classes_)[np.where(average >= 0.5, 1, 0)]
+
+    def predict_proba(self, x):
+        average = self._average(x)
+        return np.vstack([1 - average, average]).T
+
+    def score(self, x, y):
+        y = np.ravel(pd.DataFrame(y).values)
+        if self.is_regressor:
+            return r2_score(y, self.predict(x))
+        if self.classification_metrics == "f1_score":
+            return f1_score(self.predict(x), y)
+        return np.mean(self.predict(x) == y)
+
+
+def get_best_ensemble(objective, n_iter=50, verbose=True):
+    return EnsembleSelection(objective, n_iter=n_iter, verbose=verbose).fit()
@@ -1,126 +1,86 @@
+import timeit
+
 import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 from scikitallstars.timeout import on_timeout, handler_func
-from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
-from sklearn.neural_network import MLPClassifier, MLPRegressor
-from sklearn.preprocessing import MinMaxScaler, StandardScaler
-from sklearn.svm import SVC, SVR
-from sklearn.cross_decomposition import PLSRegression
-from sklearn.decomposition import PCA
-from sklearn.discriminant_analysis import (
-    LinearDiscriminantAnalysis,
-    QuadraticDiscriminantAnalysis,
-)
-from sklearn.ensemble import (
-    AdaBoostClassifier,
-    AdaBoostRegressor,
-    ExtraTreesClassifier,
-    ExtraTreesRegressor,
-    GradientBoostingClassifier,
-    GradientBoostingRegressor,
-    RandomForestClassifier,
-    RandomForestRegressor
-)
-from sklearn.linear_model import (
-    Lasso,
-    LinearRegression,
-    LogisticRegression,
-    Ridge,
-    RidgeClassifier,
-)
-from sklearn.metrics import (
-    auc,
-    classification_report,
-    confusion_matrix,
-    f1_score,
-    precision_recall_curve,
-    r2_score,
-    roc_curve,
-    mean_absolute_error,
-    mean_squared_error,
-)
+from sklearn.preprocessing import MaxAbsScaler, MinMaxScaler, StandardScaler
+from scikitallstars.preprocess import select_columns
+from scikitallstars.registry import get_family
+from sklearn.metrics import f1_score, r2_score
 
 
 class Classifier:
-    def __init__(self, params, debug=False):
+    def __init__(self, params, debug=False, support=None):
         self.params = params
         self.debug = debug
+        self.timings = {}
+        self.support = support
         if params["standardize"] == "StandardScaler":
             self.standardizer = StandardScaler()
         elif params["standardize"] == "MinMaxScaler":
             self.standardizer = MinMaxScaler()
+        elif params["standardize"] == "MaxAbsScaler":
+            self.standardizer = MaxAbsScaler()
         elif params["standardize"] == "NoScaler":
             self.standardizer = NullScaler()
 
-        if params["model_name"] == "RandomForest":
-            self.model = RandomForestClassifier(**params["model_params"])
-        elif params["model_name"] == "SVC":
-            self.model = SVC(**params["model_params"])
-        elif params["model_name"] == "MLP":
-            self.model = MLPClassifier(**params["model_params"])
-        elif params["model_name"] == "LogisticRegression":
-            self.model = LogisticRegression(**params["model_params"])
-        elif params["model_name"] == "GradientBoosting":
-            self.model = GradientBoostingClassifier(**params["model_params"])
-        elif params["model_name"] == "kNN":
-            self.model = KNeighborsClassifier(**params["model_params"])
-        elif params["model_name"] == "Ridge":
-            self.model = RidgeClassifier(**params["model_params"])
-        elif params["model_name"] == "LDA":
-            self.model = LinearDiscriminantAnalysis(**params["model_params"])
-        elif params["model_name"] == "QDA":
-            self.model = QuadraticDiscriminantAnalysis(**params["model_params"])
-        elif params["model_name"] == "ExtraTrees":
-            self.model = ExtraTreesClassifier(**params["model_params"])
-        elif params["model_name"] == "AdaBoost":
-            self.model = AdaBoostClassifier(**params["model_params"])
+        self.model = get_family(params["model_name"], is_regressor=False).create(
+            params["model_params"]
+        )
         if self.debug:
             print(self.model)
 
     def _fit_and_predict_core(
         self, x, y=None, fitting=False, proba=False, support=None, score=False
     ):
-        if support is None:
-            if fitting == True:
-                self.standardizer.fit(x)
-
-            self.standardizer.transform(x)
-            if score:
-                pred = np.array(self.model.predict(x))
-                return f1_score(pred.flatten(), np.array(y).flatten())
-
-            if fitting == True:
-                self.model.fit(x, y)
-            if y is None:
-                if proba:
-                    return self.model.predict_proba(x)
-                else:
-                    return self.model.predict(x)
-        else:
-            if fitting == True:
-                self.standardizer.fit(x.iloc[:, support])
-
-            self.standardizer.transform(x.iloc[:, support])
-            if score:
-                pred = np.array(self.model.predict(x.iloc[:, support]))
-                return f1_score(pred.flatten(), np.array(y).flatten())
-
-            if fitting == True:
-                self.model.fit(x.iloc[:, support], y)
-
-            if y is None:
-                if proba and hasattr(self.model, "predict_proba"):
-                    return self.model.predict_proba(x.iloc[:, support])
-                else:
-                    return self.model.predict(x.iloc[:, support])
+        if support is not None:
+            x = select_columns(x, support)
+
+        start = timeit.default_timer()
+        if fitting == True:
+            self.standardizer.fit(x)
+
+        x = self.standardizer.transform(x)
+        self.timings["scale"] = timeit.default_timer() - start
+        if score:
+            pred = np.array(self.model.predict(x))
+            return f1_score(pred.flatten(), np.array(y).flatten())
+
+        if fitting == True:
+            start = timeit.default_timer()
+            self.model.fit(x, y)
+            self.timings["fit"] = timeit.default_timer() - start
+
+        if y is None:
+            start = timeit.default_timer()
+            if proba and hasattr(self.model, "predict_proba"):
+                pred = self.model.predict_proba(x)
+            else:
+                pred = self.model.predict(x)
+            self.timings["predict"] = timeit.default_timer() - start
+            return pred
 
         return None
 
+    def transform(self, x, support=None):
+        if support is not None:
+            x = select_columns(x, support)
+        return self.standardizer.transform(x)
+
     @on_timeout(limit=60, handler=handler_func, hint=u"classifier.fit")
     def fit(self, x, y, support=None):
         self._fit_and_predict_core(x, y, fitting=True, support=support)
         return self
 
+    def update(self, x, y, support=None, n_estimators=10):
+        return incremental_fit(
+            self.model,
+            self.transform(x, support=support),
+            y,
+            get_family(self.params["model_name"], is_regressor=False),
+            n_estimators=n_estimators,
+        )
+
     def predict(self, x, support=None):
         pred_y = self._fit_and_predict_core(x, support=support)
         return pred_y
@@ -137,87 +97,74 @@ class Regressor:
     def __init__(self, params, debug=False, support=None):
         self.params = params
         self.debug = debug
+        self.timings = {}
         self.support = support
         if params["standardize"] == "StandardScaler":
             self.standardizer = StandardScaler()
         elif params["standardize"] == "MinMaxScaler":
             self.standardizer = MinMaxScaler()
+        elif params["standardize"] == "MaxAbsScaler":
+            self.standardizer = MaxAbsScaler()
         elif params["standardize"] == "NoScaler":
             self.standardizer = NullScaler()
 
-        if params["model_name"] == "RandomForest":
-            self.model = RandomForestRegressor(**params["model_params"])
-        elif params["model_name"] == "SVR":
-            self.model = SVR(**params["model_params"])
-        elif params["model_name"] == "MLP":
-            self.model = MLPRegressor(**params["model_params"])
-        elif params["model_name"] == "LinearRegression":
-            self.model = LinearRegression(**params["model_params"])
-        elif params["model_name"] == "PLS":
-            self.model = PLSRegression(**params["model_params"])
-        elif params["model_name"] == "GradientBoosting":
-            self.model = GradientBoostingRegressor(**params["model_params"])
-        elif params["model_name"] == "kNN":
-            self.model = KNeighborsRegressor(**params["model_params"])
-        elif params["model_name"] == "Ridge":
-            self.model = Ridge(**params["model_params"])
-        elif params["model_name"] == "Lasso":
-            self.model = Lasso(**params["model_params"])
-        elif params["model_name"] == "ExtraTrees":
-            self.model = ExtraTreesRegressor(**params["model_params"])
-        elif params["model_name"] == "AdaBoost":
-            self.model = AdaBoostRegressor(**params["model_params"])
-        else:
-            self.model = None
-            print(params)
-            raise
+        self.model = get_family(params["model_name"], is_regressor=True).create(
+            params["model_params"]
+        )
         if self.debug:
             print(self.model)
 
     def _fit_and_predict_core(
         self, x, y=None, fitting=False, proba=False, support=None, score=False
     ):
-        if support is None:
-            if fitting == True:
-                self.standardizer.fit(x)
-
-            self.standardizer.transform(x)
-            if score:
-                pred = np.array(self.model.predict(x))
-                return r2_score(pred.flatten(), np.array(y).flatten())
-
-            if fitting == True:
-                self.model.fit(x, y)
-            if y is None:
-                if proba:
-                    return self.model.predict_proba(x)
-                else:
-                    return self.model.predict(x)
-        else:
-            if fitting == True:
-                self.standardizer.fit(x.iloc[:, support])
-
-            self.standardizer.transform(x.iloc[:, support])
-            if score:
-                pred = np.array(self.model.predict(x.iloc[:, support]))
-                return r2_score(pred.flatten(), np.array(y).flatten())
-
-            if fitting == True:
-                self.model.fit(x.iloc[:, support], y)
-
-            if y is None:
-                if proba:
-                    return self.model.predict_proba(x.iloc[:, support])
-                else:
-                    return self.model.predict(x.iloc[:, support])
+        if support is not None:
+            x = select_columns(x, support)
+
+        start = timeit.default_timer()
+        if fitting == True:
+            self.standardizer.fit(x)
+
+        x = self.standardizer.transform(x)
+        self.timings["scale"] = timeit.default_timer() - start
+        if score:
+            pred = np.array(self.model.predict(x))
+            return r2_score(pred.flatten(), np.array(y).flatten())
+
+        if fitting == True:
+            start = timeit.default_timer()
+            self.model.fit(x, y)
+            self.timings["fit"] = timeit.default_timer() - start
+
+        if y is None:
+            start = timeit.default_timer()
+            if proba:
+                pred = self.model.predict_proba(x)
+            else:
+                pred = self.model.predict(x)
+            self.timings["predict"] = timeit.default_timer() - start
+            return pred
 
         return None
 
+    def transform(self, x, support=None):
+        if support is not None:
+            x = select_columns(x, support)
+        return self.standardizer.transform(x)
+
     @on_timeout(limit=60, handler=handler_func, hint=u"regressor.fit")
     def fit(self, x, y, support=None):
         self._fit_and_predict_core(x, y, fitting=True, support=support)
         return self
 
+    def update(self, x, y, support=None, n_estimators=10):
+        return incremental_fit(
+            self.model,
+            self.transform(x, support=support),
+            y,
+            get_family(self.params["model_name"], is_regressor=True),
+            n_estimators=n_estimators,
+        )
+
     def predict(self, x, support=None):
         pred_y = self._fit_and_predict_core(x, support=support)
         return pred_y
@@ -229,6 +176,31 @@ class Regressor:
     def score(self, x, y, support=None):
         return self._fit_and_predict_core(x, y, support=support, score=True)
 
+def incremental_fit(model, x, y, family, n_estimators=10):
+    if family.partial_fit and hasattr(model, "partial_fit"):
+        early_stopping = getattr(model, "early_stopping", False)
+        if early_stopping:
+            # partial_fit cannot early-stop on a validation split, and a model
+            # fitted with early stopping has no best_loss_ to continue from
+            model.set_params(early_stopping=False)
+            if getattr(model, "best_loss_", None) is None:
+                model.best_loss_ = min(model.loss_curve_)
+        model.partial_fit(x, y)
+        if early_stopping:
+            model.set_params(early_stopping=True)
+        return True
+    if family.warm_start and family.rounds in model.get_params().keys():
+        if family.rounds == "max_iter":
+            # boosting rounds actually run, which may be fewer than max_iter
+            n_rounds = model.n_iter_
+        else:
+            n_rounds = model.get_params()[family.rounds]
+        model.set_params(**{"warm_start": True, family.rounds: n_rounds + n_estimators})
+        model.fit(x, y)
+        return True
+    return False
+
+
 class NullScaler(BaseEstimator, TransformerMixin):
     def __init__(self):
         pass
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import (auc, mean_absolute_error, mean_squared_error,
+                             precision_recall_curve, r2_score, roc_curve)
+
+from scikitallstars.preprocess import as_frame, select_columns
+
+
+def model_outputs(model, x, is_regressor=False):
+    x = model.transform(x)
+    estimator = model.model
+    if is_regressor:
+        return {"pred": np.ravel(estimator.predict(x))}
+
+    classes = np.asarray(estimator.classes_)
+    if hasattr(estimator, "decision_function"):
+        score = np.ravel(estimator.decision_function(x))
+        pred = classes[(score > 0).astype(int)]
+    else:
+        proba = estimator.predict_proba(x)
+        score = proba[:, 1]
+        pred = classes[np.argmax(proba, axis=1)]
+    return {"score": score, "pred": pred, "classes": classes}
+
+
+class Evaluation:
+    def __init__(self, objective, x, y, n_jobs=None):
+        self.objective = objective
+        self.is_regressor = objective.is_regressor
+        self.x = x
+        self.y = np.ravel(np.asarray(y))
+        self.n_jobs = n_jobs
+        self.names = list(objective.best_models.keys())
+        self.outputs = {}
+        self.curves = {}
+        self.table = None
+
+    def fit(self):
+        x = select_columns(as_frame(self.x), self.objective.support)
+        models = [self.objective.best_models[name] for name in self.names]
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            outputs = list(
+                executor.map(
+                    lambda model: model_outputs(model, x, self.is_regressor), models
+                )
+            )
+        rows = []
+        for name, output in zip(self.names, outputs):
+            self.outputs[name] = output
+            if self.is_regressor:
+                values = self.regression_metrics(output)
+            else:
+                values = self.classification_metrics(name, output)
+            for metric, value in values.items():
+                rows.append([name, metric, value])
+        self.table = pd.DataFrame(rows, columns=["model", "metric", "value"])
+        return self
+
+    def regression_metrics(self, output):
+        pred = output["pred"]
+        return {
+            "r2": r2_score(self.y, pred),
+            "rmse": np.sqrt(mean_squared_error(self.y, pred)),
+            "mae": mean_absolute_error(self.y, pred),
+        }
+
+    def classification_metrics(self, name, output):
+        positive_label = output["classes"][1]
+        truth = self.y == positive_label
+        positive = output["pred"] == positive_label
+        tp = int(np.sum(positive & truth))
+        fp = int(np.sum(positive & ~truth))
+        fn = int(np.sum(~positive & truth))
+        tn = int(np.sum(~positive & ~truth))
+
+        fpr, tpr, thresholds = roc_curve(truth, output["score"])
+        precision, recall, thresholds = precision_recall_curve(truth, output["score"])
+        self.curves[name] = {
+            "fpr": fpr,
+            "tpr": tpr,
+            "precision": precision,
+            "recall": recall,
+        }
+        return {
+            "TP": tp,
+            "FN": fn,
+            "FP": fp,
+            "TN": tn,
+            "accuracy": (tp + tn) / max(tp + tn + fp + fn, 1),
+            "f1": 2 * tp / max(2 * tp + fp + fn, 1),
+            "roc_auc": auc(fpr, tpr),
+            "pr_auc": auc(recall, precision),
+        }
+
+    def wide(self):
+        table = self.table.pivot(index="model", columns="metric", values="value")
+        return table.loc[self.names]
+
+    def value(self, name, metric):
+        table = self.table
+        return table[(table["model"] == name) & (table["metric"] == metric)][
+            "value"
+        ].iloc[0]
+
+
+def evaluate(objective, X_test, y_test, n_jobs=None):
+    return Evaluation(objective, X_test, y_test, n_jobs=n_jobs).fit()
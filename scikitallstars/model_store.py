@@ -0,0 +1,108 @@
+import os
+import pickle
+
+import joblib
+
+
+class ModelStore:
+    def __init__(
+        self,
+        k=3,
+        spill_dir=None,
+        spill_models=["RandomForest", "ExtraTrees", "MLP"],
+        max_bytes=None,
+        compress=3,
+    ):
+        self.k = k
+        self.spill_dir = spill_dir
+        self.spill_models = spill_models
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.entries = {}
+        self.families = {}
+        self.evicted = []
+
+    def __contains__(self, key):
+        return key in self.entries.keys()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def add(self, key, model_name, score, model):
+        if model_name not in self.families.keys():
+            self.families[model_name] = []
+        family = self.families[model_name]
+        if len(family) >= self.k and family[-1][0] >= score:
+            self.evicted.append(key)
+            return False
+
+        entry = {"model_name": model_name, "score": score, "model": model, "path": None}
+        entry["bytes"] = self.measure(model) if self.needs_size() else 0
+        self.entries[key] = entry
+        family.append((score, key))
+        family.sort(key=lambda x: x[0], reverse=True)
+        while len(family) > self.k:
+            score, evicted_key = family.pop()
+            self.remove(evicted_key)
+
+        if self.spill_dir is not None and model_name in self.spill_models:
+            self.spill(key)
+        self.enforce_ceiling()
+        return key in self.entries.keys()
+
+    def get(self, key):
+        entry = self.entries[key]
+        if entry["model"] is None:
+            return joblib.load(entry["path"])
+        return entry["model"]
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        if entry["path"] is not None and os.path.exists(entry["path"]):
+            os.remove(entry["path"])
+        self.evicted.append(key)
+
+    def spill(self, key):
+        entry = self.entries[key]
+        if entry["model"] is None:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        entry["path"] = os.path.join(
+            self.spill_dir, "{}-{}.joblib".format(entry["model_name"], key)
+        )
+        joblib.dump(entry["model"], entry["path"], compress=self.compress)
+        entry["model"] = None
+
+    def needs_size(self):
+        return self.max_bytes is not None
+
+    def measure(self, model):
+        return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def memory_bytes(self):
+        return sum(
+            [entry["bytes"] for entry in self.entries.values() if entry["model"] is not None]
+        )
+
+    def enforce_ceiling(self):
+        if self.max_bytes is None:
+            return
+        while self.memory_bytes() > self.max_bytes:
+            in_memory = [
+                (entry["bytes"], entry["score"], key)
+                for key, entry in self.entries.items()
+                if entry["model"] is not None
+            ]
+            if len(in_memory) == 0:
+                break
+            if self.spill_dir is not None:
+                size, score, key = max(in_memory, key=lambda x: x[0])
+                self.spill(key)
+            else:
+                size, score, key = min(in_memory, key=lambda x: x[1])
+                family = self.families[self.entries[key]["model_name"]]
+                family.remove((score, key))
+                self.remove(key)
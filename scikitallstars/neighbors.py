@@ -0,0 +1,50 @@
+import copy
+import timeit
+
+import numpy as np
+
+
+class NeighborGraph:
+    def __init__(self, standardizer, x_train, y_train, x_valid, y_valid, n_neighbors):
+        from sklearn.neighbors import NearestNeighbors
+
+        start = timeit.default_timer()
+        self.standardizer = standardizer.fit(x_train)
+        self.x_train = self.standardizer.transform(x_train)
+        self.split = (x_train, x_valid, y_train, y_valid)
+        self.n_neighbors = min(n_neighbors, self.x_train.shape[0])
+        index = NearestNeighbors(n_neighbors=self.n_neighbors).fit(self.x_train)
+        self.distances, indices = index.kneighbors(
+            self.standardizer.transform(x_valid)
+        )
+        self.labels = np.asarray(y_train)[indices]
+        self.classes, self.codes = np.unique(self.labels, return_inverse=True)
+        self.codes = self.codes.reshape(self.labels.shape)
+        self.seconds = timeit.default_timer() - start
+
+    def weights(self, n_neighbors, weights):
+        distances = self.distances[:, :n_neighbors]
+        if weights == "uniform":
+            return np.ones_like(distances)
+        zero = distances == 0
+        with np.errstate(divide="ignore"):
+            inverse = 1.0 / distances
+        return np.where(zero.any(axis=1, keepdims=True), zero, inverse)
+
+    def predict(self, n_neighbors, weights="uniform", is_regressor=False):
+        n_neighbors = min(n_neighbors, self.n_neighbors)
+        w = self.weights(n_neighbors, weights)
+        if is_regressor:
+            labels = self.labels[:, :n_neighbors]
+            return np.sum(w * labels, axis=1) / np.sum(w, axis=1)
+        codes = self.codes[:, :n_neighbors]
+        votes = np.stack(
+            [np.sum(w * (codes == i), axis=1) for i in range(len(self.classes))],
+            axis=1,
+        )
+        return self.classes[np.argmax(votes, axis=1)]
+
+    def fit(self, model):
+        model.standardizer = copy.deepcopy(self.standardizer)
+        model.model.fit(self.x_train, self.split[2])
+        return model
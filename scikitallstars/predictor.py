@@ -0,0 +1,241 @@
+import time
+
+import joblib
+import numpy as np
+
+from scikitallstars.preprocess import as_dense, as_matrix, issparse, select_columns
+from scikitallstars.registry import CLASSIFIERS, REGRESSORS, capable
+
+
+class Predictor:
+    def __init__(
+        self, estimator, support=None, standardizer=None, stacking_base=None, domain=None
+    ):
+        self.estimator = estimator
+        self.domain = domain
+        self.support = None
+        if support is not None:
+            self.support = np.flatnonzero(np.asarray(support))
+        self.scale, self.offset = scaler_arrays(standardizer)
+        self.standardizer = None
+        if self.scale is None and not is_null_scaler(standardizer):
+            self.standardizer = standardizer
+        self.stacking_base = stacking_base
+
+    def transform(self, x):
+        x = as_matrix(x)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        if self.support is not None:
+            x = select_columns(x, self.support)
+        if self.scale is not None:
+            if issparse(x) and not np.any(self.offset):
+                x = x.multiply(self.scale).tocsr()
+            else:
+                x = as_dense(x) * self.scale + self.offset
+        elif self.standardizer is not None:
+            x = self.standardizer.transform(x)
+        return x
+
+    def predict(self, x, return_domain=False):
+        x = self.transform(x)
+        if self.stacking_base is None:
+            pred = self.estimator.predict(x)
+        else:
+            pred = super(self.stacking_base, self.estimator).predict(x)
+        if not return_domain:
+            return pred
+        if self.domain is None:
+            raise RuntimeError("no domain model, call fit_domain before export")
+        return pred, self.domain.transform_bin(x)
+
+
+def is_null_scaler(standardizer):
+    return standardizer is None or type(standardizer).__name__ == "NullScaler"
+
+
+def scaler_arrays(standardizer):
+    name = type(standardizer).__name__
+    if name == "StandardScaler" and standardizer.mean_ is not None:
+        scale = np.ones(len(standardizer.mean_))
+        if standardizer.with_std:
+            scale = 1.0 / standardizer.scale_
+        offset = np.zeros(len(scale))
+        if standardizer.with_mean:
+            offset = -standardizer.mean_ * scale
+        return scale, offset
+    elif name == "MinMaxScaler":
+        return standardizer.scale_.copy(), standardizer.min_.copy()
+    return None, None
+
+
+def export(model):
+    from sklearn.ensemble import StackingClassifier, StackingRegressor
+    from scikitallstars.stacking import StackingClassifierS, StackingRegressorS
+
+    best_model = model.best_model
+    if hasattr(best_model, "standardizer"):
+        domain = None
+        if getattr(model, "domain_model", None) is best_model:
+            domain = model.domain
+        return Predictor(
+            best_model.model,
+            support=model.support,
+            standardizer=best_model.standardizer,
+            domain=domain,
+        )
+    elif isinstance(best_model, StackingClassifierS):
+        return Predictor(
+            best_model, support=best_model.support, stacking_base=StackingClassifier
+        )
+    elif isinstance(best_model, StackingRegressorS):
+        return Predictor(
+            best_model, support=best_model.support, stacking_base=StackingRegressor
+        )
+    return Predictor(best_model, support=best_model.support)
+
+
+def save(model, filename):
+    if not isinstance(model, Predictor):
+        model = export(model)
+    joblib.dump(model, filename)
+    return filename
+
+
+def load(filename, mmap_mode="r"):
+    return joblib.load(filename, mmap_mode=mmap_mode)
+
+
+LINEAR_MODELS = capable(CLASSIFIERS.keys(), "linear") + [
+    name
+    for name in capable(REGRESSORS.keys(), "linear", is_regressor=True)
+    if name not in CLASSIFIERS.keys()
+]
+
+
+class LinearPredictor:
+    def __init__(
+        self, coef, intercept, classes=None, proba=False, ravel=True, one_vs_rest=False
+    ):
+        self.coef = np.ascontiguousarray(coef)
+        self.intercept = np.ascontiguousarray(intercept)
+        self.classes = classes
+        self.proba = proba
+        self.ravel = ravel
+        self.one_vs_rest = one_vs_rest
+
+    def decision_function(self, x):
+        x = np.asarray(x)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        return np.dot(x, self.coef) + self.intercept
+
+    def predict(self, x):
+        decision = self.decision_function(x)
+        if self.classes is None:
+            if self.ravel:
+                return decision.ravel()
+            return decision
+        if decision.shape[1] == 1:
+            return self.classes[(decision[:, 0] > 0).astype(int)]
+        return self.classes[decision.argmax(axis=1)]
+
+    def predict_proba(self, x):
+        if not self.proba:
+            raise RuntimeError("predict_proba is not available")
+        decision = self.decision_function(x)
+        if decision.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-decision[:, 0]))
+            return np.vstack([1 - positive, positive]).T
+        if self.one_vs_rest:
+            # as LogisticRegression does for liblinear: per-class sigmoid, normalized
+            proba = 1.0 / (1.0 + np.exp(-decision))
+        else:
+            proba = np.exp(decision - decision.max(axis=1, keepdims=True))
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict_batches(self, rows, batch_size=256):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield self.predict(np.vstack(batch))
+                batch = []
+        if len(batch) > 0:
+            yield self.predict(np.vstack(batch))
+
+
+def one_vs_rest(estimator):
+    params = estimator.get_params()
+    multi_class = params.get("multi_class", "auto")
+    if multi_class == "ovr":
+        return True
+    return multi_class != "multinomial" and params.get("solver", None) == "liblinear"
+
+
+def compile_linear(model, model_name=None, chunk_size=1024):
+    support = getattr(model, "support", None)
+    if hasattr(model, "best_models"):
+        if model_name is None:
+            model = model.best_model
+        else:
+            model = model.best_models[model_name]
+    if model.params["model_name"] not in LINEAR_MODELS:
+        raise RuntimeError("unsupported linear model", model.params["model_name"])
+
+    estimator = model.model
+    is_classifier = hasattr(estimator, "classes_")
+    if is_classifier:
+        function = estimator.decision_function
+    else:
+        function = estimator.predict
+
+    if support is None:
+        support = np.array([True] * estimator.n_features_in_)
+    n_selected = int(np.sum(support))
+
+    intercept = np.asarray(function(np.zeros((1, n_selected)))).reshape(1, -1)[0]
+    coef = np.empty((n_selected, len(intercept)))
+    for start in range(0, n_selected, chunk_size):
+        stop = min(start + chunk_size, n_selected)
+        probe = np.zeros((stop - start, n_selected))
+        probe[np.arange(stop - start), np.arange(start, stop)] = 1.0
+        coef[start:stop] = np.asarray(function(probe)).reshape(stop - start, -1) - intercept
+
+    scale, offset = scaler_arrays(model.standardizer)
+    if scale is not None:
+        intercept = intercept + np.dot(offset, coef)
+        coef = coef * scale[:, np.newaxis]
+
+    full_coef = np.zeros((len(support), coef.shape[1]))
+    full_coef[np.flatnonzero(support)] = coef
+
+    if is_classifier:
+        return LinearPredictor(
+            full_coef,
+            intercept,
+            classes=np.asarray(estimator.classes_),
+            proba=hasattr(estimator, "predict_proba"),
+            one_vs_rest=one_vs_rest(estimator),
+        )
+    ravel = np.asarray(function(np.zeros((1, n_selected)))).ndim == 1
+    return LinearPredictor(full_coef, intercept, ravel=ravel)
+
+
+def latency(predict, x, n_repeats=1000, batch_size=1):
+    x = as_matrix(x)
+    seconds = []
+    for i in range(n_repeats):
+        start = (i * batch_size) % max(x.shape[0] - batch_size + 1, 1)
+        batch = x[start : start + batch_size]
+        t0 = time.perf_counter()
+        predict(batch)
+        seconds.append(time.perf_counter() - t0)
+    microseconds = np.array(seconds) * 1e6
+    return {
+        "batch_size": batch_size,
+        "n_repeats": n_repeats,
+        "p50": float(np.percentile(microseconds, 50)),
+        "p99": float(np.percentile(microseconds, 99)),
+        "mean": float(microseconds.mean()),
+    }
@@ -1,10 +1,117 @@
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
+import scipy.sparse
 
-def remove_low_variance_features(df, threshold=0.0):
+
+def issparse(x):
+    return scipy.sparse.issparse(x)
+
+
+def as_matrix(x):
+    if issparse(x):
+        return x.tocsr()
+    return np.asarray(x)
+
+
+def as_dense(x):
+    if issparse(x):
+        return x.toarray()
+    return np.asarray(x)
+
+
+def as_frame(x):
+    if x is None or issparse(x):
+        return x
+    return pd.DataFrame(x)
+
+
+def select_columns(x, support):
+    if support is None:
+        return x
+    if isinstance(x, pd.DataFrame):
+        return x.iloc[:, support]
+    support = np.asarray(support)
+    if support.dtype == bool:
+        support = np.flatnonzero(support)
+    if issparse(x):
+        return x.tocsr()[:, support]
+    return np.asarray(x)[:, support]
+
+
+def select_rows(x, rows):
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        return x.iloc[rows]
+    if issparse(x):
+        return x.tocsr()[rows]
+    return np.asarray(x)[rows]
+
+
+def concat_rows(x, y):
+    if issparse(x) or issparse(y):
+        return scipy.sparse.vstack([x, y], format="csr")
+    return pd.concat([pd.DataFrame(x), pd.DataFrame(y)], ignore_index=True)
+
+
+def downcast(x, dtype="float32"):
+    if x is None or dtype is None:
+        return x
+    if issparse(x):
+        return x.tocsr().astype(dtype, copy=False)
+    if isinstance(x, pd.DataFrame):
+        if all([str(t) == str(np.dtype(dtype)) for t in x.dtypes]):
+            return x
+        return pd.DataFrame(
+            np.ascontiguousarray(x.values, dtype=dtype),
+            index=x.index,
+            columns=x.columns,
+            copy=False,
+        )
+    return pd.DataFrame(np.ascontiguousarray(x, dtype=dtype), copy=False)
+
+
+def nbytes(x):
+    if x is None:
+        return 0
+    if issparse(x):
+        x = x.tocsr()
+        return int(x.data.nbytes + x.indices.nbytes + x.indptr.nbytes)
+    return int(pd.DataFrame(x).memory_usage(index=False).sum())
+
+
+def sparse_variance(x, dtype=None):
+    x = x.tocsr()
+    if dtype is not None:
+        x = x.astype(dtype, copy=False)
+    mean = np.ravel(x.mean(axis=0))
+    return np.ravel(x.multiply(x).mean(axis=0)) - mean ** 2
+
+
+def sparse_corrcoef(x, dtype=None, columns=None):
+    x = x.tocsr()
+    if dtype is not None:
+        x = x.astype(dtype, copy=False)
+    n = x.shape[0]
+    if columns is None:
+        columns = np.arange(x.shape[1])
+    mean = np.ravel(x.mean(axis=0))
+    variance = (np.ravel(x.multiply(x).sum(axis=0)) - n * mean ** 2) / (n - 1)
+    std = np.sqrt(np.maximum(variance, 0))
+    std[std == 0] = 1
+    block = x[:, columns]
+    cov = (
+        np.asarray((block.T @ x).todense()) - n * np.outer(mean[columns], mean)
+    ) / (n - 1)
+    return cov / np.outer(std[columns], std)
+
+
+def remove_low_variance_features(df, threshold=0.0, dtype=None):
+    if issparse(df):
+        return select_columns(df, sparse_variance(df, dtype=dtype) > threshold)
     ok_id = []
-    for colid, col in enumerate(df.values.T):
+    values = df.values
+    if dtype is not None:
+        values = values.astype(dtype, copy=False)
+    for colid, col in enumerate(values.T):
         try:
             if np.var(col) > threshold:
                 ok_id.append(colid)
@@ -14,8 +121,26 @@ def remove_low_variance_features(df, threshold=0.0):
     return df.iloc[:, ok_id]
 
 
-def remove_high_correlation_features(df, threshold=0.95):
-    corrcoef = np.corrcoef(df.T.values.tolist())
+def remove_high_correlation_features(
+    df, threshold=0.95, dtype=None, max_elements=2 ** 24
+):
+    if issparse(df):
+        # correlations of a block of columns at a time, never the dense p x p
+        n_features = df.shape[1]
+        block_size = max(1, max_elements // n_features)
+        selected = np.ones(n_features, dtype=bool)
+        for start in range(0, n_features, block_size):
+            columns = np.arange(start, min(start + block_size, n_features))
+            corrcoef = sparse_corrcoef(df, dtype=dtype, columns=columns)
+            for k, i in enumerate(columns):
+                if selected[i]:
+                    selected[i + 1 :][np.abs(corrcoef[k, i + 1 :]) >= threshold] = False
+        return select_columns(df, selected)
+
+    values = df.values
+    if dtype is not None:
+        values = values.astype(dtype, copy=False)
+    corrcoef = np.corrcoef(values, rowvar=False)
     selected_or_not = {}
     for i, array in enumerate(corrcoef):
         if i not in selected_or_not.keys():
@@ -26,11 +151,15 @@ def remove_high_correlation_features(df, threshold=0.95):
                     if abs(ary) >= threshold:
                         selected_or_not[j] = False
 
-    return df.iloc[:, [i for i, array in enumerate(corrcoef) if selected_or_not[i]]]
+    return select_columns(
+        df, [i for i, array in enumerate(corrcoef) if selected_or_not[i]]
+    )
 
 
 class TableCleaner:
     def __init__(self):
+        from sklearn.ensemble import RandomForestRegressor
+
         self.model = RandomForestRegressor(n_estimators=1, max_depth=1, n_jobs=-1)
         self.success_col = None
         self.success_row = None
@@ -0,0 +1,775 @@
+import importlib
+
+import numpy as np
+
+
+class Family:
+    def __init__(
+        self,
+        name,
+        estimator,
+        search_space,
+        requires=[],
+        warm_start=False,
+        predict_proba=False,
+        n_jobs=False,
+        partial_fit=False,
+        linear=False,
+        float32=False,
+        sparse=False,
+        categorical=False,
+        rounds="n_estimators",
+        grid=None,
+    ):
+        self.name = name
+        self.estimator = estimator
+        self.search_space = search_space
+        self.requires = requires
+        self.warm_start = warm_start
+        self.predict_proba = predict_proba
+        self.n_jobs = n_jobs
+        self.partial_fit = partial_fit
+        self.linear = linear
+        self.float32 = float32
+        self.sparse = sparse
+        self.categorical = categorical
+        self.rounds = rounds
+        self.grid = grid
+
+    def load(self):
+        for module_name in self.requires:
+            try:
+                importlib.import_module(module_name)
+            except ImportError:
+                pass
+        module_name, class_name = self.estimator.rsplit(".", 1)
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def create(self, model_params):
+        return self.load()(**model_params)
+
+    def capable(self, capability):
+        return getattr(self, capability, False)
+
+
+CLASSIFIERS = {}
+REGRESSORS = {}
+
+
+def register(families, name, estimator, search_space, **capabilities):
+    families[name] = Family(name, estimator, search_space, **capabilities)
+    return families[name]
+
+
+def get_family(name, is_regressor=False):
+    if is_regressor:
+        if name not in REGRESSORS.keys():
+            raise RuntimeError("unsupported regressor", name)
+        return REGRESSORS[name]
+    if name not in CLASSIFIERS.keys():
+        raise RuntimeError("unsupported classifier", name)
+    return CLASSIFIERS[name]
+
+
+def capable(names, capability, is_regressor=False):
+    return [
+        name for name in names if get_family(name, is_regressor).capable(capability)
+    ]
+
+
+def categorical_mask(objective):
+    if objective.categorical_features is None:
+        return None
+    categorical_features = np.array(objective.categorical_features)
+    if objective.support is not None:
+        categorical_features = categorical_features[objective.support]
+    if not categorical_features.any():
+        return None
+    return categorical_features
+
+
+def no_params(objective, trial, x, params):
+    return {}
+
+
+def no_params_grid(objective):
+    return {}
+
+
+def knn_classifier_grid(objective):
+    return {
+        "knn_n_neighbors": list(
+            range(objective.knn_n_neighbors[0], objective.knn_n_neighbors[1] + 1)
+        ),
+        "knn_weights": objective.knn_weights,
+        "knn_algorithm": objective.knn_algorithm,
+        # leaf_size only changes speed, not predictions
+        "knn_leaf_size": [int(np.mean(objective.knn_leaf_size))],
+    }
+
+
+def knn_regressor_grid(objective):
+    return {
+        "knn_n_neighbors": list(
+            range(objective.knn_n_neighbors[0], objective.knn_n_neighbors[1] + 1)
+        ),
+        "knn_weights": objective.knn_weights,
+        "knn_algorithm": objective.knn_algorithm,
+    }
+
+
+def linear_regression_grid(objective):
+    return {
+        "linear_regression_fit_intercept": objective.linear_regression_fit_intercept
+    }
+
+
+def svc_params(objective, trial, x, params):
+    model_params = {}
+    model_params["kernel"] = trial.suggest_categorical(
+        "svc_kernel", ["linear", "rbf"]
+    )
+    model_params["C"] = trial.suggest_loguniform(
+        "svm_c", objective.svm_c[0], objective.svm_c[1]
+    )
+    # model_params["epsilon"] = trial.suggest_loguniform(
+    #    "svm_epsilon", objective.svm_epsilon[0], objective.svm_epsilon[1]
+    # )
+    if model_params["kernel"] == "rbf":
+        model_params["gamma"] = trial.suggest_categorical(
+            "svc_gamma", ["auto", "scale"]
+        )
+    else:
+        model_params["gamma"] = "auto"
+    model_params["max_iter"] = objective.svm_max_iter
+    model_params["probability"] = True
+    return model_params
+
+
+def random_forest_classifier_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_estimators"] = trial.suggest_int(
+        "rf_n_estimators", objective.rf_n_estimators[0], objective.rf_n_estimators[1]
+    )
+    model_params["max_features"] = trial.suggest_categorical(
+        "rf_max_features", objective.rf_max_features
+    )
+    model_params["n_jobs"] = -1
+    model_params["max_depth"] = trial.suggest_int(
+        "rf_max_depth", objective.rf_max_depth[0], objective.rf_max_depth[1]
+    )
+    model_params["warm_start"] = trial.suggest_categorical(
+        "rf_warm_start", objective.rf_warm_start
+    )
+    return model_params
+
+
+def mlp_classifier_params(objective, trial, x, params):
+    model_params = {}
+    layers = []
+    n_layers = trial.suggest_int(
+        "n_layers", objective.mlp_n_layers[0], objective.mlp_n_layers[1]
+    )
+    for i in range(n_layers):
+        layers.append(
+            trial.suggest_int(
+                str(i), objective.mlp_n_neurons[0], objective.mlp_n_neurons[1]
+            )
+        )
+    model_params["hidden_layer_sizes"] = set(layers)
+    model_params["max_iter"] = objective.mlp_max_iter
+    model_params["early_stopping"] = True
+    model_params["warm_start"] = trial.suggest_categorical(
+        "mlp_warm_start", objective.mlp_warm_start
+    )
+    model_params["activation"] = trial.suggest_categorical(
+        "mlp_activation", objective.mlp_activation
+    )
+    return model_params
+
+
+def logistic_regression_params(objective, trial, x, params):
+    model_params = {}
+    model_params["C"] = trial.suggest_loguniform(
+        "lr_C", objective.lr_C[0], objective.lr_C[0]
+    )
+    model_params["solver"] = trial.suggest_categorical(
+        "lr_solver", objective.lr_solver
+    )
+    model_params["max_iter"] = objective.lr_max_iter
+    return model_params
+
+
+def gradient_boosting_classifier_params(objective, trial, x, params):
+    model_params = {}
+    model_params["loss"] = trial.suggest_categorical("loss", objective.gb_loss)
+    model_params["n_estimators"] = trial.suggest_int(
+        "gb_n_estimators", objective.gb_n_estimators[0], objective.gb_n_estimators[1]
+    )
+    model_params["max_depth"] = trial.suggest_int(
+        "gb_max_depth", objective.gb_max_depth[0], objective.gb_max_depth[1]
+    )
+    model_params["warm_start"] = trial.suggest_categorical(
+        "gb_warm_start", objective.gb_warm_start
+    )
+    return model_params
+
+
+def extra_trees_classifier_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_estimators"] = trial.suggest_int(
+        "et_n_estimators", objective.et_n_estimators[0], objective.et_n_estimators[1]
+    )
+    model_params["max_depth"] = trial.suggest_int(
+        "et_max_depth", objective.et_max_depth[0], objective.et_max_depth[1]
+    )
+    model_params["warm_start"] = trial.suggest_categorical(
+        "et_warm_start", objective.et_warm_start
+    )
+    return model_params
+
+
+def ada_boost_classifier_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_estimators"] = trial.suggest_int(
+        "ab_n_estimators", objective.ab_n_estimators[0], objective.ab_n_estimators[1]
+    )
+    # model_params["loss"] = trial.suggest_categorical(
+    #    "ab_loss", objective.ab_loss
+    # )
+    return model_params
+
+
+def knn_classifier_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_neighbors"] = trial.suggest_int(
+        "knn_n_neighbors", objective.knn_n_neighbors[0], objective.knn_n_neighbors[1]
+    )
+    model_params["weights"] = trial.suggest_categorical(
+        "knn_weights", objective.knn_weights
+    )
+    model_params["algorithm"] = trial.suggest_categorical(
+        "knn_algorithm", objective.knn_algorithm
+    )
+    model_params["leaf_size"] = trial.suggest_int(
+        "knn_leaf_size", objective.knn_leaf_size[0], objective.knn_leaf_size[1]
+    )
+    return model_params
+
+
+def ridge_classifier_params(objective, trial, x, params):
+    model_params = {}
+    model_params["alpha"] = trial.suggest_loguniform(
+        "ridge_alpha", objective.ridge_alpha[0], objective.ridge_alpha[1]
+    )
+    model_params["max_iter"] = objective.ridge_max_iter
+    model_params["normalize"] = trial.suggest_categorical(
+        "ridge_normalize", objective.ridge_normalize
+    )
+    model_params["solver"] = trial.suggest_categorical(
+        "ridge_solver", objective.ridge_solver
+    )
+    return model_params
+
+
+def gradient_boosting_regressor_params(objective, trial, x, params):
+    model_params = {}
+    # model_params["loss"] = trial.suggest_categorical(
+    #    "gb_loss", ["ls", "lad", "huber", "quantile"]
+    # )
+    model_params["learning_rate"] = trial.suggest_loguniform(
+        "learning_rate_init",
+        objective.gb_learning_rate_init[0],
+        objective.gb_learning_rate_init[1],
+    )
+    model_params["n_estimators"] = trial.suggest_int(
+        "gb_n_estimators", objective.gb_n_estimators[0], objective.gb_n_estimators[1]
+    )
+    # model_params["criterion"] = trial.suggest_categorical(
+    #    "gb_criterion", ["friedman_mse", "mse", "mae"]
+    # )
+    model_params["max_depth"] = trial.suggest_int(
+        "gb_max_depth", objective.gb_max_depth[0], objective.gb_max_depth[1]
+    )
+    model_params["warm_start"] = trial.suggest_categorical(
+        "gb_warm_start", objective.gb_warm_start
+    )
+    # model_params["max_features"] = trial.suggest_categorical(
+    #    "gb_max_features", ["auto", "sqrt", "log2"]
+    # )
+    # model_params["tol"] = trial.suggest_loguniform(
+    #    "gb_tol", 1e-5, 1e-3
+    # )
+    return model_params
+
+
+def extra_trees_regressor_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_estimators"] = trial.suggest_int(
+        "et_n_estimators", objective.et_n_estimators[0], objective.et_n_estimators[1]
+    )
+    # model_params["criterion"] = trial.suggest_categorical(
+    #    "et_criterion", ["mse", "mae"]
+    # )
+    model_params["max_depth"] = trial.suggest_int(
+        "et_max_depth", objective.et_max_depth[0], objective.et_max_depth[1]
+    )
+    model_params["max_features"] = trial.suggest_categorical(
+        "et_max_features", ["auto"] #, "sqrt", "log2"]
+    )
+    model_params["bootstrap"] = True
+    model_params["oob_score"] = trial.suggest_categorical(
+        "et_oob_score", [True]
+    )
+    model_params["warm_start"] = trial.suggest_categorical(
+        "et_warm_start", objective.et_warm_start
+    )
+    return model_params
+
+
+def random_forest_regressor_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_estimators"] = trial.suggest_int(
+        "rf_n_estimators", objective.rf_n_estimators[0], objective.rf_n_estimators[1]
+    )
+    # model_params["criterion"] = trial.suggest_categorical(
+    #    "rf_criterion", ["mse", "mae"]
+    # )
+    model_params["max_depth"] = trial.suggest_int(
+        "rf_max_depth", objective.rf_max_depth[0], objective.rf_max_depth[1]
+    )
+    model_params["max_features"] = trial.suggest_categorical(
+        "rf_max_features", objective.rf_max_features
+    )
+    model_params["bootstrap"] = True
+    model_params["oob_score"] = trial.suggest_categorical(
+        "rf_oob_score", [True]
+    )
+    model_params["warm_start"] = trial.suggest_categorical(
+        "rf_warm_start", objective.rf_warm_start
+    )
+    return model_params
+
+
+def ada_boost_regressor_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_estimators"] = trial.suggest_int(
+        "ab_n_estimators", objective.ab_n_estimators[0], objective.ab_n_estimators[1]
+    )
+    model_params["learning_rate"] = trial.suggest_loguniform(
+        "ab_learning_rate", 0.1, 1.0
+    )
+    model_params["loss"] = trial.suggest_categorical(
+        "ab_loss", objective.ab_loss
+    )
+    return model_params
+
+
+def mlp_regressor_params(objective, trial, x, params):
+    model_params = {}
+    layers = []
+    n_layers = trial.suggest_int(
+        "n_layers", objective.mlp_n_layers[0], objective.mlp_n_layers[1]
+    )
+    for i in range(n_layers):
+        layers.append(
+            trial.suggest_int(
+                str(i), objective.mlp_n_neurons[0], objective.mlp_n_neurons[1]
+            )
+        )
+    model_params["hidden_layer_sizes"] = set(layers)
+    # model_params["activation"] = trial.suggest_categorical(
+    #    "mlp_activation", objective.mlp_activation
+    # )
+    # model_params["solver"] = trial.suggest_categorical(
+    #    "mlp_solver", ["sgd", "adam"]
+    # )
+    model_params["solver"] = "adam"
+    model_params["learning_rate"] = trial.suggest_categorical(
+        "mlp_learning_rate", ["constant", "invscaling", "adaptive"]
+    )
+    if model_params["solver"] in ["sgd", "adam"]:
+        model_params["learning_rate_init"] = trial.suggest_loguniform(
+            "mlp_learning_rate_init", 1e-4, 1e-2
+        )
+    model_params["max_iter"] = objective.mlp_max_iter
+    model_params["early_stopping"] = True
+    model_params["warm_start"] = trial.suggest_categorical(
+        "mlp_warm_start", objective.mlp_warm_start
+    )
+    return model_params
+
+
+def svr_params(objective, trial, x, params):
+    model_params = {}
+    model_params["kernel"] = trial.suggest_categorical(
+        "svm_kernel", objective.svm_kernel
+    )
+    model_params["C"] = trial.suggest_loguniform(
+        "svm_c", objective.svm_c[0], objective.svm_c[1]
+    )
+    if model_params["kernel"] == "rbf":
+        model_params["gamma"] = trial.suggest_categorical(
+            "svc_gamma", ["auto"] #, "scale"]
+        )
+    else:
+        model_params["gamma"] = "auto"
+    model_params["max_iter"] = objective.svm_max_iter
+    # model_params["epsilon"] = trial.suggest_loguniform(
+    #    "svm_epsilon", objective.svm_epsilon[0], objective.svm_epsilon[1]
+    # )
+    return model_params
+
+
+def knn_regressor_params(objective, trial, x, params):
+    model_params = {}
+    model_params["n_neighbors"] = trial.suggest_int(
+        "knn_n_neighbors", objective.knn_n_neighbors[0], objective.knn_n_neighbors[1]
+    )
+    model_params["weights"] = trial.suggest_categorical(
+        "knn_weights", objective.knn_weights
+    )
+    model_params["algorithm"] = trial.suggest_categorical(
+        "knn_algorithm", objective.knn_algorithm
+    )
+    return model_params
+
+
+def ridge_regressor_params(objective, trial, x, params):
+    model_params = {}
+    model_params["alpha"] = trial.suggest_loguniform(
+        "ridge_alpha", objective.ridge_alpha[0], objective.ridge_alpha[1]
+    )
+    model_params["max_iter"] = objective.ridge_max_iter
+    # model_params["normalize"] = trial.suggest_categorical(
+    #    "ridge_normalize", objective.ridge_normalize
+    #)
+    model_params["solver"] = trial.suggest_categorical(
+        "ridge_solver", objective.ridge_solver
+    )
+    return model_params
+
+
+def lasso_params(objective, trial, x, params):
+    model_params = {}
+    model_params["alpha"] = trial.suggest_loguniform(
+        "lasso_alpha", objective.lasso_alpha[0], objective.lasso_alpha[1]
+    )
+    model_params["max_iter"] = objective.lasso_max_iter
+    model_params["warm_start"] = trial.suggest_categorical(
+        "lasso_warm_start", objective.lasso_warm_start
+    )
+    # model_params["normalize"] = trial.suggest_categorical(
+    #    "lasso_normalize", objective.lasso_normalize
+    #)
+    model_params["selection"] = trial.suggest_categorical(
+        "lasso_selection", objective.lasso_selection
+    )
+    return model_params
+
+
+def pls_params(objective, trial, x, params):
+    model_params = {}
+    if objective.support is None:
+        model_params["n_components"] = trial.suggest_int(
+            "n_components", 2, objective.x_train.shape[1]
+        )
+    else:
+        model_params["n_components"] = trial.suggest_int(
+            "n_components", 2, objective.x_train.iloc[:, objective.support].shape[1]
+        )
+    model_params["max_iter"] = objective.pls_max_iter
+    model_params["scale"] = trial.suggest_categorical(
+        "pls_scale", objective.pls_scale
+    )
+    # model_params["algorithm"] = trial.suggest_categorical(
+    #    "pls_algorithm", objective.pls_algorithm
+    # )
+    model_params["tol"] = trial.suggest_loguniform(
+        "pls_tol",
+        objective.pls_tol[0],
+        objective.pls_tol[1],
+    )
+    return model_params
+
+
+def linear_regression_params(objective, trial, x, params):
+    model_params = {}
+    model_params["fit_intercept"] = trial.suggest_categorical(
+        "linear_regression_fit_intercept",
+        objective.linear_regression_fit_intercept,
+    )
+    # model_params["normalize"] = trial.suggest_categorical(
+    #    "linear_regression_normalize", objective.linear_regression_normalize
+    #)
+    return model_params
+
+
+def hist_gradient_boosting_params(objective, trial, x, params):
+    model_params = {}
+    model_params["learning_rate"] = trial.suggest_loguniform(
+        "hgb_learning_rate", objective.hgb_learning_rate[0], objective.hgb_learning_rate[1]
+    )
+    model_params["max_iter"] = trial.suggest_int(
+        "hgb_max_iter", objective.hgb_max_iter[0], objective.hgb_max_iter[1]
+    )
+    model_params["max_leaf_nodes"] = trial.suggest_int(
+        "hgb_max_leaf_nodes", objective.hgb_max_leaf_nodes[0], objective.hgb_max_leaf_nodes[1]
+    )
+    model_params["max_depth"] = trial.suggest_int(
+        "hgb_max_depth", objective.hgb_max_depth[0], objective.hgb_max_depth[1]
+    )
+    model_params["min_samples_leaf"] = trial.suggest_int(
+        "hgb_min_samples_leaf",
+        objective.hgb_min_samples_leaf[0],
+        objective.hgb_min_samples_leaf[1],
+    )
+    model_params["l2_regularization"] = trial.suggest_loguniform(
+        "hgb_l2_regularization",
+        objective.hgb_l2_regularization[0],
+        objective.hgb_l2_regularization[1],
+    )
+    model_params["early_stopping"] = True
+    model_params["n_iter_no_change"] = objective.hgb_n_iter_no_change
+    model_params["validation_fraction"] = objective.hgb_validation_fraction
+    categorical_features = categorical_mask(objective)
+    if categorical_features is not None:
+        model_params["categorical_features"] = categorical_features
+    return model_params
+
+
+HIST_GRADIENT_BOOSTING = ["sklearn.experimental.enable_hist_gradient_boosting"]
+
+register(
+    CLASSIFIERS,
+    "LogisticRegression",
+    "sklearn.linear_model.LogisticRegression",
+    logistic_regression_params,
+    predict_proba=True,
+    n_jobs=True,
+    linear=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "LDA",
+    "sklearn.discriminant_analysis.LinearDiscriminantAnalysis",
+    no_params,
+    predict_proba=True,
+    linear=True,
+    grid=no_params_grid,
+)
+register(
+    CLASSIFIERS,
+    "QDA",
+    "sklearn.discriminant_analysis.QuadraticDiscriminantAnalysis",
+    no_params,
+    predict_proba=True,
+    grid=no_params_grid,
+)
+register(
+    CLASSIFIERS,
+    "Ridge",
+    "sklearn.linear_model.RidgeClassifier",
+    ridge_classifier_params,
+    linear=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "SVC",
+    "sklearn.svm.SVC",
+    svc_params,
+    predict_proba=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "MLP",
+    "sklearn.neural_network.MLPClassifier",
+    mlp_classifier_params,
+    warm_start=True,
+    predict_proba=True,
+    partial_fit=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "kNN",
+    "sklearn.neighbors.KNeighborsClassifier",
+    knn_classifier_params,
+    predict_proba=True,
+    n_jobs=True,
+    float32=True,
+    sparse=True,
+    grid=knn_classifier_grid,
+)
+register(
+    CLASSIFIERS,
+    "AdaBoost",
+    "sklearn.ensemble.AdaBoostClassifier",
+    ada_boost_classifier_params,
+    predict_proba=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "RandomForest",
+    "sklearn.ensemble.RandomForestClassifier",
+    random_forest_classifier_params,
+    warm_start=True,
+    predict_proba=True,
+    n_jobs=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "ExtraTrees",
+    "sklearn.ensemble.ExtraTreesClassifier",
+    extra_trees_classifier_params,
+    warm_start=True,
+    predict_proba=True,
+    n_jobs=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "GradientBoosting",
+    "sklearn.ensemble.GradientBoostingClassifier",
+    gradient_boosting_classifier_params,
+    warm_start=True,
+    predict_proba=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    CLASSIFIERS,
+    "HistGradientBoosting",
+    "sklearn.ensemble.HistGradientBoostingClassifier",
+    hist_gradient_boosting_params,
+    requires=HIST_GRADIENT_BOOSTING,
+    warm_start=True,
+    categorical=True,
+    rounds="max_iter",
+    predict_proba=True,
+    float32=True,
+)
+
+register(
+    REGRESSORS,
+    "LinearRegression",
+    "sklearn.linear_model.LinearRegression",
+    linear_regression_params,
+    n_jobs=True,
+    linear=True,
+    float32=True,
+    sparse=True,
+    grid=linear_regression_grid,
+)
+register(
+    REGRESSORS,
+    "PLS",
+    "sklearn.cross_decomposition.PLSRegression",
+    pls_params,
+    linear=True,
+)
+register(
+    REGRESSORS,
+    "Lasso",
+    "sklearn.linear_model.Lasso",
+    lasso_params,
+    warm_start=True,
+    linear=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "Ridge",
+    "sklearn.linear_model.Ridge",
+    ridge_regressor_params,
+    linear=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "SVR",
+    "sklearn.svm.SVR",
+    svr_params,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "MLP",
+    "sklearn.neural_network.MLPRegressor",
+    mlp_regressor_params,
+    warm_start=True,
+    partial_fit=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "kNN",
+    "sklearn.neighbors.KNeighborsRegressor",
+    knn_regressor_params,
+    n_jobs=True,
+    float32=True,
+    sparse=True,
+    grid=knn_regressor_grid,
+)
+register(
+    REGRESSORS,
+    "AdaBoost",
+    "sklearn.ensemble.AdaBoostRegressor",
+    ada_boost_regressor_params,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "RandomForest",
+    "sklearn.ensemble.RandomForestRegressor",
+    random_forest_regressor_params,
+    warm_start=True,
+    n_jobs=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "ExtraTrees",
+    "sklearn.ensemble.ExtraTreesRegressor",
+    extra_trees_regressor_params,
+    warm_start=True,
+    n_jobs=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "GradientBoosting",
+    "sklearn.ensemble.GradientBoostingRegressor",
+    gradient_boosting_regressor_params,
+    warm_start=True,
+    float32=True,
+    sparse=True,
+)
+register(
+    REGRESSORS,
+    "HistGradientBoosting",
+    "sklearn.ensemble.HistGradientBoostingRegressor",
+    hist_gradient_boosting_params,
+    requires=HIST_GRADIENT_BOOSTING,
+    warm_start=True,
+    categorical=True,
+    rounds="max_iter",
+    float32=True,
+)
@@ -0,0 +1,166 @@
+import base64
+import html
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from scikitallstars import depict
+from scikitallstars.evaluation import evaluate
+from scikitallstars.preprocess import issparse
+
+
+def new_figure():
+    # a figure outside pyplot, so charts can be drawn from worker threads
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+class Report:
+    def __init__(
+        self,
+        objective,
+        X_test=None,
+        y_test=None,
+        evaluation=None,
+        formats=["png"],
+        max_points=100000,
+        dpi=100,
+        n_jobs=None,
+        stacking_model=None,
+    ):
+        self.objective = objective
+        self.X_test = X_test
+        self.y_test = y_test
+        self.stacking_model = stacking_model
+        self.evaluation = evaluation
+        if evaluation is None and X_test is not None:
+            self.evaluation = evaluate(objective, X_test, y_test, n_jobs=n_jobs)
+        self.formats = formats
+        self.max_points = max_points
+        self.dpi = dpi
+        self.n_jobs = n_jobs
+        self.outputs = {}
+        self.futures = {}
+
+    def charts(self):
+        objective = self.objective
+        charts = {
+            "best_scores": (depict.best_scores, (objective,), {}),
+            "training_summary": (depict.training_summary, (objective,), {}),
+        }
+        model = objective.best_models.get("RandomForest", None)
+        if model is not None and hasattr(model.model, "feature_importances_"):
+            charts["feature_importances"] = (depict.feature_importances, (objective,), {})
+        if self.stacking_model is not None:
+            charts["model_importances"] = (
+                depict.model_importances,
+                (self.stacking_model,),
+                {},
+            )
+        if self.evaluation is not None:
+            if self.evaluation.is_regressor:
+                charts["metrics"] = (
+                    depict.all_regression_metrics,
+                    (objective, None, None),
+                    {"evaluation": self.evaluation, "max_points": self.max_points},
+                )
+            else:
+                charts["metrics"] = (
+                    depict.all_classification_metrics,
+                    (objective, None, None),
+                    {"evaluation": self.evaluation},
+                )
+        if self.X_test is not None and not issparse(objective.x_train):
+            charts["train_test_metrics"] = (
+                depict.metrics,
+                (objective, objective.x_train, objective.y_train, self.X_test, self.y_test),
+                {},
+            )
+        return charts
+
+    def render_chart(self, name, draw, args, kwargs, output_dir=None):
+        fig = draw(*args, fig=new_figure(), **kwargs)
+        outputs = {}
+        for fmt in self.formats:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, dpi=self.dpi, bbox_inches="tight")
+            outputs[fmt] = buffer.getvalue()
+            if output_dir is not None:
+                with open(os.path.join(output_dir, name + "." + fmt), "wb") as f:
+                    f.write(outputs[fmt])
+        self.outputs[name] = outputs
+        return outputs
+
+    def submit(self, executor, output_dir=None):
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        return {
+            name: executor.submit(self.render_chart, name, draw, args, kwargs, output_dir)
+            for name, (draw, args, kwargs) in self.charts().items()
+        }
+
+    def render(self, output_dir=None, wait=True):
+        executor = ThreadPoolExecutor(max_workers=self.n_jobs)
+        self.futures = self.submit(executor, output_dir=output_dir)
+        executor.shutdown(wait=wait)
+        if not wait:
+            return self.futures
+        return self.wait()
+
+    def wait(self):
+        return {name: future.result() for name, future in self.futures.items()}
+
+    def html(self, filename=None, title="scikitallstars report"):
+        if len(self.futures) == 0:
+            self.render()
+        self.wait()
+        body = ["<h1>{}</h1>".format(html.escape(title))]
+        if self.evaluation is not None:
+            body.append(self.evaluation.wide().to_html(float_format="%.4f"))
+        for name, outputs in self.outputs.items():
+            body.append("<h2>{}</h2>".format(html.escape(name)))
+            if "svg" in outputs.keys():
+                body.append(outputs["svg"].decode("utf-8"))
+            elif "png" in outputs.keys():
+                body.append(
+                    '<img src="data:image/png;base64,{}"/>'.format(
+                        base64.b64encode(outputs["png"]).decode("ascii")
+                    )
+                )
+        text = "<html><head><meta charset='utf-8'><title>{}</title></head><body>{}</body></html>".format(
+            html.escape(title), "\n".join(body)
+        )
+        if filename is not None:
+            with open(filename, "w") as f:
+                f.write(text)
+        return text
+
+
+def build_report(
+    objective,
+    X_test=None,
+    y_test=None,
+    output_dir=None,
+    html_file=None,
+    formats=["png"],
+    max_points=100000,
+    n_jobs=None,
+    stacking_model=None,
+):
+    report = Report(
+        objective,
+        X_test=X_test,
+        y_test=y_test,
+        formats=formats,
+        max_points=max_points,
+        n_jobs=n_jobs,
+        stacking_model=stacking_model,
+    )
+    report.render(output_dir=output_dir)
+    if html_file is not None:
+        report.html(html_file)
+    return report
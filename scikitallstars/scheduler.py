@@ -0,0 +1,111 @@
+import timeit
+
+import numpy as np
+
+from scikitallstars.lazy import LazyModule
+from scikitallstars.registry import get_family
+
+optuna = LazyModule("optuna")
+
+
+class UCB1:
+    def __init__(self, arms):
+        self.arms = list(arms)
+        self.counts = {arm: 0 for arm in self.arms}
+        self.rewards = {arm: 0.0 for arm in self.arms}
+        self.limits = {}
+
+    def active(self):
+        return [
+            arm
+            for arm in self.arms
+            if arm not in self.limits.keys() or self.counts[arm] < self.limits[arm]
+        ]
+
+    def select(self):
+        arms = self.active()
+        if len(arms) == 0:
+            return None
+        for arm in arms:
+            if self.counts[arm] == 0:
+                return arm
+        total = np.log(sum(self.counts.values()))
+        return max(
+            arms,
+            key=lambda arm: self.rewards[arm] / self.counts[arm]
+            + np.sqrt(2 * total / self.counts[arm]),
+        )
+
+    def update(self, arm, reward):
+        self.counts[arm] += 1
+        self.rewards[arm] += min(max(reward, 0.0), 1.0)
+
+    def means(self):
+        return {
+            arm: self.rewards[arm] / self.counts[arm]
+            for arm in self.arms
+            if self.counts[arm] > 0
+        }
+
+
+def family_study(objective, model_name):
+    family = get_family(model_name, is_regressor=objective.is_regressor)
+    if family.grid is not None:
+        grid = dict(family.grid(objective))
+        grid["model_name"] = [model_name]
+        grid["standardize"] = list(objective.scalers)
+        sampler = optuna.samplers.GridSampler(grid)
+        size = int(np.prod([len(values) for values in grid.values()]))
+    else:
+        sampler = optuna.samplers.PartialFixedSampler(
+            {"model_name": model_name}, optuna.samplers.TPESampler()
+        )
+        size = None
+    return optuna.create_study(direction="maximize", sampler=sampler), size
+
+
+class FamilyScheduler:
+    def __init__(self, objective):
+        self.objective = objective
+        self.model_names = list(objective.get_model_names())
+        self.bandit = UCB1(self.model_names)
+        self.studies = {}
+        for model_name in self.model_names:
+            study, size = family_study(objective, model_name)
+            self.studies[model_name] = study
+            if size is not None:
+                self.bandit.limits[model_name] = size
+
+    def step(self):
+        model_name = self.bandit.select()
+        if model_name is None:
+            return None
+        study = self.studies[model_name]
+        study.optimize(self.objective, n_trials=1, catch=(Exception,))
+        trial = study.trials[-1]
+        reward = 0.0
+        if trial.state == optuna.trial.TrialState.COMPLETE:
+            reward = trial.value
+        self.bandit.update(model_name, reward)
+        return model_name
+
+    def run(self, timeout=100, n_trials=100, verbose=True):
+        start = timeit.default_timer()
+        for _ in range(n_trials):
+            if self.objective.stopped:
+                break
+            if timeout is not None and timeit.default_timer() - start > timeout:
+                break
+            if self.step() is None:
+                break
+        if verbose:
+            print("trials per family:", self.bandit.counts)
+        return self
+
+    @property
+    def trials(self):
+        return [
+            trial
+            for model_name in self.model_names
+            for trial in self.studies[model_name].trials
+        ]
@@ -1,10 +1,14 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.model_selection import train_test_split
 
+from scikitallstars.lazy import LazyModule
+from scikitallstars.preprocess import as_frame, downcast, select_rows
+
+plt = LazyModule("matplotlib.pyplot")
+
 
 class SplitTester:
     def __init__(
@@ -15,6 +19,7 @@ class SplitTester:
         smallest=0,
         largest=20,
         verbose=True,
+        dtype=None,
     ):
         self.test_size = test_size
         self.n_trials = n_trials
@@ -28,6 +33,7 @@ class SplitTester:
         self.best_model = None
         self.history = []
         self.verbose = verbose
+        self.dtype = dtype
         self.feature_importances = {}
         self.feature_names = []
         self.scores = {}
@@ -37,7 +43,7 @@ class SplitTester:
         self.Y_test = None
 
     def __call__(self, X, Y, splitter=train_test_split):
-        X = pd.DataFrame(X)
+        X = downcast(pd.DataFrame(X), self.dtype)
         Y = pd.DataFrame(Y).iloc[:, 0]
         self.feature_names = X.columns
         if len(list(set(list(Y)))) == 2:
@@ -108,28 +114,31 @@ class SplitTester:
 
 
 class KMeansSplitter:
-    def __init__(self, representative=True, test_size=0.1, random_state=None):
+    def __init__(
+        self, representative=True, test_size=0.1, random_state=None, dtype=None
+    ):
         self.representative = representative
+        self.dtype = dtype
         self.test_size = test_size
         self.random_state = random_state
         self.error = 0.0001
         self.max_trial = 530000
 
     def __call__(self, X, Y, test_size=0.1, random_state=None):
-        X = pd.DataFrame(X)
+        X = downcast(as_frame(X), self.dtype)
         Y = pd.DataFrame(Y)
         self.test_size = test_size
         self.random_state = random_state
         train_ids, test_ids = self.split_ids(X)
         return (
-            X.iloc[train_ids, :],
-            X.iloc[test_ids, :],
+            select_rows(X, train_ids),
+            select_rows(X, test_ids),
             Y.iloc[train_ids, :],
             Y.iloc[test_ids, :],
         )
 
     def split_ids(self, X):
-        X = pd.DataFrame(X)
+        X = as_frame(X)
 
         n_clusters = 20 #int(len(X.columns) * self.test_size)
         cids = KMeans(
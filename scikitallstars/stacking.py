@@ -1,12 +1,22 @@
+import contextlib
+import timeit
+
+import numpy as np
 import pandas as pd
-import optuna
+from joblib import Parallel, cpu_count, delayed, parallel_backend
+from sklearn.base import clone
 from sklearn.ensemble import StackingClassifier, StackingRegressor
-from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.model_selection import cross_val_predict, train_test_split
+from sklearn.pipeline import make_pipeline
 from scikitallstars.splitters import KMeansSplitter
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from scikitallstars.lazy import LazyModule
+
+optuna = LazyModule("optuna")
 
 class StackingObjective:
-    def __init__(self, objective, X_train, y_train, x_valid=None, y_valid=None, test_size=0.1, verbose=True, train_random_state=None):
+    def __init__(self, objective, X_train, y_train, x_valid=None, y_valid=None, test_size=0.1, verbose=True, train_random_state=None, oof=True, cv=5, saturation=3, n_jobs=None, backend="loky", random_state=None):
         self.x_train = X_train
         self.y_train = y_train
         self.x_valid = x_valid
@@ -27,8 +37,28 @@ class StackingObjective:
         self.is_regressor = objective.is_regressor
         self.test_size = test_size
         self.train_random_state = train_random_state
+        self.oof = oof
+        self.cv = cv
+        self.oof_cache = None
+        self.memo = {}
+        self.base_caches = {}
+        self.hits = {}
+        self.saturation = saturation
+        self.random = np.random.RandomState(random_state)
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def stop_callback(self, study, trial):
+        if self.stopped:
+            study.stop()
 
     def __call__(self, trial):
+        if self.stopped:
+            raise optuna.TrialPruned()
         self.n_trial += 1
         estimators = []
         key = ""
@@ -48,7 +78,7 @@ class StackingObjective:
         # params["max_features"] = trial.suggest_categorical(
         #            "rf_max_features", self.rf_max_features
         #        )
-        params["n_jobs"] = -1
+        params["n_jobs"] = -1 if self.n_jobs is None else self.n_jobs
         params["warm_start"] = trial.suggest_categorical(
             "rf_warm_start", self.rf_warm_start
         )
@@ -62,34 +92,24 @@ class StackingObjective:
             "rf_oob_score", self.rf_oob_score
         )
 
-        if key in self.already_tried.keys():
-            pass
-            # return self.already_tried[key]
-
         if len(estimators) == 0:
             return 0 - 530000
 
-        if True:  # self.support is None:
-            if self.x_valid is None:
-                kmeans_split = KMeansSplitter(representative=True)
-                x_train, x_valid, y_train, y_valid = kmeans_split(
-                    self.x_train, self.y_train, test_size=self.test_size, random_state=self.train_random_state
-                )
-            else:
-                x_train = self.x_train
-                y_train = self.y_train
-                x_valid = self.x_valid
-                y_valid = self.y_valid
+        names = [name for name, model in estimators]
+        split_id = self.split_id()
+        memo_key = (key, tuple(sorted(params.items())), split_id)
+        if split_id is not None and memo_key in self.memo.keys():
+            self.hits[key] = self.hits.get(key, 0) + 1
+            if self.hits[key] >= self.saturation:
+                self.redirect(trial)
+            trial.set_user_attr("cached", True)
+            score, stacking_model1 = self.memo[memo_key]
         else:
-            x_train, x_valid, y_train, y_valid = kmeans_split(
-                self.x_train.iloc[:, self.support], self.y_train, test_size=self.test_size
-            )
-        stacking_model1 = stacking(
-            self.objective, estimators=estimators, verbose=self.verbose, params=params
-        )
-        stacking_model1.support = self.objective.support
-        stacking_model1.fit(x_train, y_train)
-        score = stacking_model1.score(x_valid, y_valid)
+            cache = self.base_stack(key, names, split_id)
+            stacking_model1 = cache.stacking(names, params=params)
+            score = cache.score(stacking_model1)
+            if split_id is not None:
+                self.memo[memo_key] = (score, stacking_model1)
         if self.verbose:
             print("Trial ", self.n_trial, score)
             print(stacking_model1.final_estimator_)
@@ -102,9 +122,58 @@ class StackingObjective:
             self.best_model = stacking_model1
 
         self.already_tried[key] = score
-
         return score
 
+    def base_stack(self, key, names, split_id):
+        # base predictions depend only on the subset, the meta-learner is fit per params
+        if split_id is not None and (key, split_id) in self.base_caches.keys():
+            return self.base_caches[(key, split_id)]
+
+        if self.oof:
+            if self.oof_cache is None:
+                self.oof_cache = OOFCache(
+                    self.objective, cv=self.cv, n_jobs=self.n_jobs, backend=self.backend
+                ).fit(*self.split())
+            cache = self.oof_cache
+        else:
+            cache = OOFCache(
+                self.objective, names=names, cv=self.cv, n_jobs=self.n_jobs, backend=self.backend
+            ).fit(*self.split())
+        if self.verbose:
+            print("base model fit times", cache.fit_times)
+        if split_id is not None:
+            self.base_caches[(key, split_id)] = cache
+        return cache
+
+    def split_id(self):
+        if self.oof or self.x_valid is not None:
+            return 0
+        return self.train_random_state
+
+    def redirect(self, trial, n_attempts=100):
+        model_names = [
+            name
+            for name in self.objective.get_model_names()
+            if name in self.objective.best_models.keys()
+        ]
+        for _ in range(n_attempts):
+            bits = self.random.randint(0, 2, len(model_names))
+            key = "".join([str(bit) for bit in bits])
+            if bits.sum() > 0 and key not in self.already_tried.keys():
+                trial.study.enqueue_trial(
+                    {name: int(bit) for name, bit in zip(model_names, bits)}
+                )
+                return key
+        return None
+
+    def split(self):
+        if self.x_valid is None:
+            kmeans_split = KMeansSplitter(representative=True)
+            return kmeans_split(
+                self.x_train, self.y_train, test_size=self.test_size, random_state=self.train_random_state
+            )
+        return self.x_train, self.x_valid, self.y_train, self.y_valid
+
     def predict(self, X):
         return self.best_model.predict(X)
 
@@ -112,6 +181,202 @@ class StackingObjective:
         return self.best_model.score(X, Y)
 
 
+class OOFCache:
+    def __init__(self, objective, names=None, cv=5, n_jobs=None, backend="loky"):
+        self.objective = objective
+        self.names = names
+        self.support = objective.support
+        self.is_regressor = objective.is_regressor
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.fit_times = {}
+        self.models = {}
+        self.methods = {}
+        self.columns = {}
+        self.oof = None
+        self.valid = None
+        self.y_train = None
+        self.y_valid = None
+
+    def fit(self, x_train, x_valid, y_train, y_valid):
+        x_train = select_support(x_train, self.support)
+        x_valid = select_support(x_valid, self.support)
+        self.y_train = np.ravel(pd.DataFrame(y_train).values)
+        self.y_valid = np.ravel(pd.DataFrame(y_valid).values)
+        names = [
+            name
+            for name in self.objective.get_model_names()
+            if name in self.objective.best_models.keys()
+            and (self.names is None or name in self.names)
+        ]
+        outer, inner = core_budget(self.n_jobs, len(names))
+        with parallel_context(self.backend, inner, n_jobs=outer):
+            results = Parallel(
+                n_jobs=outer, prefer="threads" if self.backend == "threading" else None
+            )(
+                delayed(fit_base_model)(
+                    base_pipeline(self.objective.best_models[name], inner),
+                    stack_method(self.objective.best_models[name].model, self.is_regressor),
+                    x_train,
+                    self.y_train,
+                    x_valid,
+                    self.cv,
+                )
+                for name in names
+            )
+
+        oof = []
+        valid = []
+        n_columns = 0
+        for name, (estimator, method, oof_pred, valid_pred, seconds) in zip(names, results):
+            self.fit_times[name] = seconds
+            self.models[name] = estimator
+            self.methods[name] = method
+            self.columns[name] = list(range(n_columns, n_columns + oof_pred.shape[1]))
+            n_columns += oof_pred.shape[1]
+            oof.append(oof_pred)
+            valid.append(valid_pred)
+        self.oof = np.hstack(oof)
+        self.valid = np.hstack(valid)
+        return self
+
+    def select(self, names):
+        return [column for name in names for column in self.columns[name]]
+
+    def stacking(self, names, params=None):
+        if params is None:
+            params = {}
+        if self.is_regressor:
+            final_estimator = RandomForestRegressor(**params)
+        else:
+            final_estimator = RandomForestClassifier(**params)
+        final_estimator.fit(self.oof[:, self.select(names)], self.y_train)
+        return OOFStacking(
+            [(name, self.models[name]) for name in names],
+            final_estimator,
+            [self.methods[name] for name in names],
+            support=self.support,
+            is_regressor=self.is_regressor,
+        )
+
+    def score(self, model):
+        pred = model.final_estimator_.predict(
+            self.valid[:, self.select(model.named_estimators_.keys())]
+        )
+        if self.is_regressor:
+            return r2_score(self.y_valid, pred)
+        return accuracy_score(self.y_valid, pred)
+
+
+def fit_base_model(estimator, method, x_train, y_train, x_valid, cv):
+    start = timeit.default_timer()
+    oof_pred = stack_output(
+        cross_val_predict(estimator, x_train, y_train, cv=cv, method=method), method
+    )
+    estimator.fit(x_train, y_train)
+    seconds = timeit.default_timer() - start
+    valid_pred = stack_output(getattr(estimator, method)(x_valid), method)
+    return estimator, method, oof_pred, valid_pred, seconds
+
+
+def core_budget(n_jobs, n_tasks):
+    # None uses every core, like the meta-learner's n_jobs=-1
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    elif n_jobs < 0:
+        n_jobs = max(cpu_count() + 1 + n_jobs, 1)
+    outer = max(min(n_jobs, n_tasks), 1)
+    inner = max(n_jobs // outer, 1)
+    return outer, inner
+
+
+def base_pipeline(model, n_jobs=None):
+    if not hasattr(model, "standardizer"):
+        return limit_n_jobs(model, n_jobs)
+    # the wrappers scale their input, so stack the scaler with the estimator
+    return make_pipeline(clone(model.standardizer), limit_n_jobs(model.model, n_jobs))
+
+
+def limit_n_jobs(estimator, n_jobs):
+    estimator = clone(estimator)
+    params = {
+        key: n_jobs for key in estimator.get_params().keys() if key.endswith("n_jobs")
+    }
+    if len(params) > 0:
+        estimator.set_params(**params)
+    return estimator
+
+
+def parallel_context(backend, n_threads, n_jobs=None):
+    if backend == "threading":
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            return contextlib.suppress()
+        return threadpool_limits(limits=n_threads)
+    return parallel_backend(backend, n_jobs=n_jobs, inner_max_num_threads=n_threads)
+
+
+class OOFStacking:
+    def __init__(self, estimators, final_estimator, methods, support=None, is_regressor=True):
+        self.named_estimators_ = dict(estimators)
+        self.final_estimator_ = final_estimator
+        self.methods = methods
+        self.support = support
+        self.is_regressor = is_regressor
+        if not is_regressor:
+            self.classes_ = final_estimator.classes_
+
+    def transform(self, x):
+        if self.support is not None and len(self.support) == x.shape[1]:
+            x = select_support(x, self.support)
+        return np.hstack(
+            [
+                stack_output(getattr(estimator, method)(x), method)
+                for estimator, method in zip(self.named_estimators_.values(), self.methods)
+            ]
+        )
+
+    def predict(self, x):
+        return self.final_estimator_.predict(self.transform(x))
+
+    def predict_proba(self, x):
+        return self.final_estimator_.predict_proba(self.transform(x))
+
+    def score(self, x, y):
+        y = np.ravel(pd.DataFrame(y).values)
+        if self.is_regressor:
+            return r2_score(y, self.predict(x))
+        return accuracy_score(y, self.predict(x))
+
+
+def select_support(x, support):
+    if support is None:
+        return x
+    if isinstance(x, pd.DataFrame):
+        return x.iloc[:, support]
+    return np.asarray(x)[:, support]
+
+
+def stack_method(model, is_regressor):
+    if is_regressor:
+        return "predict"
+    for method in ["predict_proba", "decision_function"]:
+        if hasattr(model, method):
+            return method
+    return "predict"
+
+
+def stack_output(pred, method):
+    pred = np.asarray(pred)
+    if pred.ndim == 1:
+        return pred.reshape(-1, 1)
+    if method == "predict_proba" and pred.shape[1] == 2:
+        return pred[:, 1:]
+    return pred
+
+
 def get_best_stacking(
     objective,
     X_train,
@@ -122,11 +387,25 @@ def get_best_stacking(
     timeout=1000,
     n_trials=50,
     show_progress_bar=True,
+    oof=True,
+    n_jobs=None,
 ):
     X_train = pd.DataFrame(X_train)
     if type(y_train) is not pd.core.series.Series:
         y_train = pd.DataFrame(y_train)[0]
-    stacking_objective = StackingObjective(objective, X_train, y_train, x_valid=x_valid, y_valid=y_valid)
+    stacking_objective = StackingObjective(objective, X_train, y_train, x_valid=x_valid, y_valid=y_valid, oof=oof, n_jobs=n_jobs)
+    return stacking_search(
+        stacking_objective,
+        timeout=timeout,
+        n_trials=n_trials,
+        show_progress_bar=show_progress_bar,
+    )
+
+
+def stacking_search(
+    stacking_objective, timeout=1000, n_trials=50, show_progress_bar=True, callbacks=[]
+):
+    objective = stacking_objective.objective
     study = optuna.create_study(direction="maximize")
 
     try_all = {}
@@ -152,6 +431,7 @@ def get_best_stacking(
         timeout=timeout,
         n_trials=n_trials,
         show_progress_bar=show_progress_bar,
+        callbacks=list(callbacks) + [stacking_objective.stop_callback],
     )
     return stacking_objective
 
@@ -227,11 +507,12 @@ def stacking(
     verbose=True,
     estimators=None,
     params=None,
+    n_jobs=None,
 ):
     if estimators is None:
         if use_all:
             estimators = [
-                (name, model.model) for name, model in objective.best_models.items()
+                (name, model) for name, model in objective.best_models.items()
             ]
 
         else:
@@ -244,11 +525,14 @@ def stacking(
             estimators = []
             for name, model in objective.best_models.items():
                 if objective.best_scores[name] >= threshold:
-                    estimators.append((name, model.model))
+                    estimators.append((name, model))
 
     if verbose:
         print([name for name, model in estimators])
 
+    outer, inner = core_budget(n_jobs, len(estimators))
+    estimators = [(name, base_pipeline(model, inner)) for name, model in estimators]
+
     if objective.is_regressor:
         if final_estimator is None:
             if params is None:
@@ -259,6 +543,7 @@ def stacking(
         model = StackingRegressorS(
             estimators=estimators,
             final_estimator=final_estimator,
+            n_jobs=outer,
         )
         model.support = objective.support
     else:
@@ -271,6 +556,7 @@ def stacking(
         model = StackingClassifierS(
             estimators=estimators,
             final_estimator=final_estimator,
+            n_jobs=outer,
         )
         model.support = objective.support
     return model
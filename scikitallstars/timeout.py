@@ -1,3 +1,4 @@
+import threading
 from functools import wraps
 
 
@@ -11,6 +12,15 @@ def on_timeout(limit, handler, hint=None):
         def __wrapper(*args, **kwargs):
             import signal
 
+            if threading.current_thread() is not threading.main_thread():
+                # SIGALRM only reaches the main thread, notify from a timer instead
+                timer = threading.Timer(limit, notify_handler, args=(None, None))
+                timer.daemon = True
+                timer.start()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    timer.cancel()
             signal.signal(signal.SIGALRM, notify_handler)
             signal.alarm(limit)
             result = function(*args, **kwargs)
@@ -10,6 +10,7 @@ from __future__ import division, print_function, unicode_literals
 import multiprocessing
 import signal
 import sys
+import threading
 import time
 from functools import wraps
 
@@ -45,6 +46,20 @@ def _raise_exception(exception, exception_message):
         raise exception(exception_message)
 
 
+_local = threading.local()
+
+
+def check_deadline():
+    """Raise the timeout of the innermost running `timeout` call if it has expired.
+
+    Off the main thread SIGALRM is unavailable, so `timeout` records a deadline
+    instead and long running code calls this between steps.
+    """
+    for deadline, timeout_exception, exception_message in getattr(_local, "deadlines", []):
+        if time.time() > deadline:
+            _raise_exception(timeout_exception, exception_message)
+
+
 def timeout(
     seconds=None,
     use_signals=True,
@@ -76,6 +91,11 @@ def timeout(
             @wraps(function)
             def new_function(*args, **kwargs):
                 new_seconds = kwargs.pop("timeout", seconds)
+                if new_seconds and threading.current_thread() is not threading.main_thread():
+                    # SIGALRM can only be handled in the main thread
+                    return _cooperative(
+                        function, new_seconds, timeout_exception, exception_message, args, kwargs
+                    )
                 if new_seconds:
                     old = signal.signal(signal.SIGALRM, handler)
                     signal.setitimer(signal.ITIMER_REAL, new_seconds)
@@ -105,6 +125,16 @@ def timeout(
     return decorate
 
 
+def _cooperative(function, seconds, timeout_exception, exception_message, args, kwargs):
+    if not hasattr(_local, "deadlines"):
+        _local.deadlines = []
+    _local.deadlines.append((time.time() + seconds, timeout_exception, exception_message))
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _local.deadlines.pop()
+
+
 def _target(queue, function, *args, **kwargs):
     """Run a function with arguments and return output via a queue.
 
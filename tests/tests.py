@@ -1,14 +1,37 @@
+import asyncio
+import json
 import os
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import timeit
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.abspath("../scikitallstars/"))
 
+import joblib
+import numpy as np
+import optuna
 import pandas as pd
 import pytest
+import scipy.sparse
 import sklearn.datasets
-from sklearn.model_selection import train_test_split
+from scipy.stats import spearmanr
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from sklearn.model_selection import cross_val_predict, train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 
-from scikitallstars import allstars, depict
+from scikitallstars import (aio, allstars, avd, benchmark, datasource, depict,
+                            distributed, ensemble, estimators, evaluation,
+                            model_store, neighbors, predictor, preprocess,
+                            registry, report, scheduler, stacking, timeout,
+                            timeout_decorator)
 
 
 def test_allstars_classification():
@@ -19,6 +42,813 @@ def test_allstars_regression():
     common_process(sklearn.datasets.load_diabetes())
 
 
+LAZY_MODULES = [
+    "matplotlib",
+    "optuna",
+    "sklearn.cross_decomposition",
+    "sklearn.discriminant_analysis",
+    "sklearn.ensemble",
+    "sklearn.linear_model",
+    "sklearn.neighbors",
+    "sklearn.neural_network",
+    "sklearn.svm",
+    "sklearn.tree",
+]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="-X importtime needs Python 3.7")
+def test_import_time():
+    # time scikitallstars itself on top of its already imported dependencies
+    script = "; ".join(
+        [
+            "import json, sys",
+            "import joblib, numpy, pandas, scipy.sparse",
+            "import sklearn.metrics, sklearn.model_selection",
+            "import scikitallstars.allstars",
+            "print(json.dumps(sorted(sys.modules)))",
+        ]
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    modules = json.loads(process.stdout.splitlines()[-1])
+    for name in LAZY_MODULES:
+        assert name not in modules
+    # "import time: self [us] | cumulative | imported package"
+    cumulative = [
+        int(line.split("|")[1])
+        for line in process.stderr.splitlines()
+        if line.startswith("import time:")
+        and line.split("|")[2].strip() == "scikitallstars.allstars"
+    ]
+    assert len(cumulative) == 1
+    assert cumulative[0] < 200000
+
+
+def test_benchmark():
+    report = benchmark.run(
+        sizes=[(200, 5)],
+        tasks=["classification"],
+        isolated=False,
+        verbose=False,
+        n_trials=1,
+        timeout=10,
+        stacking_trials=1,
+        n_latency=10,
+    )
+    result = report["results"][0]
+    assert result["trials_per_second"] > 0
+    assert result["peak_rss"] > 0
+    assert "search" in result["seconds"].keys()
+
+
+def test_fit_async_cancel():
+    dataset = sklearn.datasets.load_breast_cancer()
+
+    async def cancel():
+        search = aio.fit_async(
+            dataset.data, dataset.target, feature_selection=False, verbose=False
+        )
+        return await search.cancel()
+
+    # asyncio.run needs Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        objective = loop.run_until_complete(cancel())
+    finally:
+        loop.close()
+    assert objective.stopped
+
+
+requires_journal = pytest.mark.skipif(
+    distributed.journal_backend() is None, reason="optuna has no journal storage"
+)
+
+
+@requires_journal
+def test_distributed():
+    dataset = sklearn.datasets.load_breast_cancer()
+    workdir = tempfile.mkdtemp()
+    objective = allstars.fit(
+        dataset.data,
+        dataset.target,
+        feature_selection=False,
+        n_trials=1,
+        timeout=20,
+        n_workers=2,
+        workdir=workdir,
+        verbose=False,
+    )
+    artifacts = os.listdir(distributed.artifact_dir(workdir))
+    assert "worker-local-0.joblib" in artifacts and "worker-local-1.joblib" in artifacts
+    assert objective.best_model is not None
+    assert len(objective.study.trials) >= len(objective.get_model_names())
+
+
+@requires_journal
+def test_distributed_keeps_predictions_and_settings():
+    dataset = sklearn.datasets.load_breast_cancer()
+    objective = allstars.build_objective(
+        dataset.data,
+        dataset.target,
+        feature_selection=False,
+        keep_predictions=True,
+        verbose=False,
+    )
+    objective.set_model_names(["kNN", "LDA"])
+    objective.knn_weights = ["distance"]
+    workdir = tempfile.mkdtemp()
+    distributed.search(objective, workdir=workdir, n_workers=2, n_trials=2, timeout=20, verbose=False)
+    knn_trials = [
+        trial
+        for trial in objective.study.get_trials(states=[optuna.trial.TrialState.COMPLETE])
+        if trial.params["model_name"] == "kNN"
+    ]
+    assert len(knn_trials) > 0
+    assert all(trial.params["knn_weights"] == "distance" for trial in knn_trials)
+    assert len(objective.valid_predictions) > 0
+    assert set(objective.valid_predictions.keys()) == set(objective.model_store.keys())
+    assert ensemble.get_best_ensemble(objective, n_iter=5, verbose=False) is not None
+
+    joblib.dump(
+        {
+            "worker_id": "empty",
+            "best_scores": {"QDA": 0},
+            "best_models": {},
+            "scores": {},
+            "times": {},
+            "telemetry": [],
+            "valid_predictions": {},
+            "y_valid_kept": None,
+            "valid_classes": None,
+            "model_store": None,
+        },
+        os.path.join(distributed.artifact_dir(workdir), "worker-empty.joblib"),
+    )
+    merged = distributed.merge(workdir, verbose=False)
+    assert merged.best_scores["QDA"] == 0 and "QDA" not in merged.best_models
+    assert merged.best_model is not None
+    assert len(merged.valid_predictions) > 0
+
+    with pytest.raises(ValueError):
+        allstars.fit(dataset.data, dataset.target, n_workers=2, adaptive=True, verbose=False)
+
+
+def test_family_scheduler():
+    dataset = sklearn.datasets.load_breast_cancer()
+    objective = allstars.build_objective(
+        dataset.data, dataset.target, feature_selection=False, verbose=False
+    )
+    objective.set_model_names(["LDA", "kNN", "AdaBoost"])
+    family_scheduler = scheduler.FamilyScheduler(objective).run(
+        timeout=100, n_trials=10, verbose=False
+    )
+    counts = family_scheduler.bandit.counts
+    assert sum(counts.values()) == 10
+    assert counts["LDA"] <= family_scheduler.bandit.limits["LDA"]
+    assert objective.best_model is not None
+
+
+def test_neighbor_graph():
+    dataset = sklearn.datasets.load_breast_cancer()
+    X_train, X_valid, y_train, y_valid = train_test_split(
+        dataset.data, dataset.target, random_state=0
+    )
+    graph = neighbors.NeighborGraph(
+        StandardScaler(), X_train, y_train, X_valid, y_valid, 10
+    )
+    for weights in ["uniform", "distance"]:
+        model = KNeighborsClassifier(n_neighbors=5, weights=weights)
+        model.fit(graph.x_train, y_train)
+        pred = model.predict(graph.standardizer.transform(X_valid))
+        assert np.array_equal(graph.predict(5, weights), pred)
+
+
+def test_float32_downcast():
+    dataset = sklearn.datasets.load_breast_cancer()
+    x = pd.DataFrame(dataset.data)
+    x32 = preprocess.downcast(x, "float32")
+    assert all([str(t) == "float32" for t in x32.dtypes])
+    assert preprocess.nbytes(x32) * 2 == preprocess.nbytes(x)
+    assert preprocess.remove_high_correlation_features(x, dtype="float32").shape == (
+        preprocess.remove_high_correlation_features(x).shape
+    )
+    objective = allstars.Objective(x, dataset.target, dtype="float32")
+    assert objective.memory_saved > 0
+    with pytest.warns(UserWarning, match="upcasts"):
+        objective.warn_upcast("LDA", x32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        objective.warn_upcast("LDA", x32)
+        objective.warn_upcast("RandomForest", x32)
+
+
+def test_categorical_scaler_is_recorded():
+    dataset = sklearn.datasets.load_breast_cancer()
+    x = pd.DataFrame(dataset.data)
+    x[0] = (x[0] > x[0].median()).astype(int)
+    categorical_features = [True] + [False] * (x.shape[1] - 1)
+    objective = allstars.Objective(
+        x, dataset.target, categorical_features=categorical_features
+    )
+    study = optuna.create_study(direction="maximize")
+    study.enqueue_trial({"model_name": "HistGradientBoosting"})
+    study.optimize(objective, n_trials=1)
+    assert study.trials[0].params["categorical_standardize"] == "NoScaler"
+    assert "standardize" not in study.trials[0].params.keys()
+    assert objective.telemetry[0]["standardize"] == "NoScaler"
+    model = objective.best_models["HistGradientBoosting"]
+    assert type(model.standardizer).__name__ == "NullScaler"
+
+
+def test_incremental_update():
+    dataset = sklearn.datasets.load_breast_cancer()
+    X_train, X_new, y_train, y_new = train_test_split(
+        dataset.data, dataset.target, test_size=0.3, random_state=0
+    )
+    objective = allstars.Objective(pd.DataFrame(X_train), y_train)
+    study = optuna.create_study(direction="maximize")
+    for model_name in ["HistGradientBoosting", "ExtraTrees", "MLP"]:
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=3)
+    hgb = objective.best_models["HistGradientBoosting"].model
+    n_iter = hgb.n_iter_
+    n_trees = objective.best_models["ExtraTrees"].model.n_estimators
+    objective.update(X_new, y_new, n_estimators=5)
+    assert all(objective.updated.values())
+    assert hgb.max_iter == n_iter + 5 and hgb.n_iter_ > n_iter
+    assert objective.best_models["ExtraTrees"].model.n_estimators == n_trees + 5
+    assert objective.best_models["MLP"].model.early_stopping
+
+    lasso = registry.get_family("Lasso", is_regressor=True).create({}).fit(X_train, y_train)
+    assert not estimators.incremental_fit(
+        lasso, X_new, y_new, registry.get_family("Lasso", is_regressor=True)
+    )
+
+
+def test_update_flags_drift():
+    dataset = sklearn.datasets.load_breast_cancer()
+    X_train, X_new, y_train, y_new = train_test_split(
+        dataset.data, dataset.target, test_size=0.3, random_state=0
+    )
+    objective = allstars.Objective(pd.DataFrame(X_train), y_train)
+    study = optuna.create_study(direction="maximize")
+    study.enqueue_trial({"model_name": "ExtraTrees"})
+    study.optimize(objective, n_trials=1)
+    n_trees = objective.best_model.model.n_estimators
+    assert not objective.update(X_new[:60], y_new[:60], n_estimators=5)
+
+    # shifted labels, with enough new trees to learn them: the models must be
+    # scored on the new rows before they are trained on them
+    x_shift, y_shift = pd.DataFrame(X_new[60:]), pd.Series(1 - y_new[60:])
+    before = {
+        name: objective.evaluate(model, x_shift, y_shift, support=objective.support)
+        for name, model in objective.best_models.items()
+    }
+    assert objective.update(x_shift, y_shift, n_estimators=4 * n_trees)
+    assert objective.update_scores == before
+
+
+def test_knn_domain_threshold_and_approximation():
+    random = np.random.RandomState(0)
+    X = random.normal(size=(2000, 20))
+    x = random.normal(size=(300, 20))
+    exact = avd.KNN(out=0.05).fit(X)
+    assert abs(np.mean(exact.transform_bin(X)) - 0.95) < 0.01
+    approximate = avd.KNN(out=0.05, approximate=True, random_state=0).fit(X)
+    distances = exact.transform(x)
+    approximate_distances = approximate.transform(x)
+    assert np.all(approximate_distances >= distances - 1e-9)
+    assert np.mean((approximate_distances - distances) / distances) < 0.1
+    assert np.mean(approximate.transform_bin(x) == exact.transform_bin(x)) > 0.9
+    index = avd.RandomProjectionIndex(random_state=0, max_elements=1000).fit(X)
+    assert np.allclose(index.kneighbors(x)[0], approximate.model.kneighbors(x)[0])
+
+
+def test_sparse_fit_predict_export():
+    dataset = sklearn.datasets.load_breast_cancer()
+    median = np.median(dataset.data, axis=0)
+    x = scipy.sparse.csr_matrix(np.where(dataset.data > median, dataset.data, 0))
+    objective = allstars.build_objective(
+        x, dataset.target, feature_selection=False, verbose=False
+    )
+    assert objective.sparse
+    objective.set_model_names(["LogisticRegression", "kNN"])
+    allstars.search(objective, n_trials=2, verbose=False, show_progress_bar=False)
+    objective.fit_domain("knn", approximate=True, random_state=0)
+    pred, in_domain = objective.predict(x, return_domain=True)
+    filename = os.path.join(tempfile.mkdtemp(), "sparse.joblib")
+    model = predictor.load(predictor.save(objective, filename))
+    exported_pred, exported_domain = model.predict(x, return_domain=True)
+    assert np.array_equal(pred, exported_pred)
+    assert np.array_equal(in_domain, exported_domain)
+    assert preprocess.remove_high_correlation_features(x, max_elements=100).shape[1] == (
+        preprocess.remove_high_correlation_features(pd.DataFrame(x.toarray())).shape[1]
+    )
+
+
+def test_exported_predictor_matches_objective():
+    for dataset, model_name in [
+        (sklearn.datasets.load_breast_cancer(), "LogisticRegression"),
+        (sklearn.datasets.load_diabetes(), "kNN"),
+    ]:
+        support = np.arange(dataset.data.shape[1]) % 3 != 0
+        for scaler in ["StandardScaler", "MinMaxScaler"]:
+            objective = allstars.Objective(
+                pd.DataFrame(dataset.data), dataset.target, support=support
+            )
+            study = optuna.create_study(direction="maximize")
+            study.enqueue_trial({"model_name": model_name, "standardize": scaler})
+            study.optimize(objective, n_trials=1)
+            model = predictor.export(objective)
+            assert model.scale is not None
+            assert np.allclose(
+                model.predict(dataset.data), objective.predict(dataset.data)
+            )
+            assert np.allclose(
+                model.predict(dataset.data[0]), objective.predict(dataset.data[:1])
+            )
+
+
+def test_linear_predictor_matches_model():
+    iris = sklearn.datasets.load_iris()
+    diabetes = sklearn.datasets.load_diabetes()
+    cancer = sklearn.datasets.load_breast_cancer()
+    for x, y, model_name, model_params, classifier in [
+        (cancer.data, cancer.target, "LogisticRegression", {"max_iter": 5000}, True),
+        (iris.data, iris.target, "LogisticRegression", {"solver": "liblinear"}, True),
+        (iris.data, iris.target, "LogisticRegression", {"solver": "lbfgs"}, True),
+        (diabetes.data, diabetes.target, "LinearRegression", {}, False),
+    ]:
+        params = {
+            "standardize": "StandardScaler",
+            "model_name": model_name,
+            "model_params": model_params,
+        }
+        try:
+            if classifier:
+                model = estimators.Classifier(params).fit(x, y)
+            else:
+                model = estimators.Regressor(params).fit(x, y)
+        except ValueError:
+            # multiclass liblinear (one-vs-rest) was removed in scikit-learn 1.8
+            continue
+        linear_model = predictor.compile_linear(model)
+        scaled = model.transform(x)
+        assert np.allclose(linear_model.predict(x), model.predict(x))
+        if classifier:
+            assert np.allclose(
+                linear_model.decision_function(x).reshape(len(x), -1),
+                model.model.decision_function(scaled).reshape(len(x), -1),
+            )
+            assert np.allclose(
+                linear_model.predict_proba(x), model.model.predict_proba(scaled)
+            )
+
+
+def test_linear_predictor_with_feature_selection():
+    cancer = sklearn.datasets.load_breast_cancer()
+    diabetes = sklearn.datasets.load_diabetes()
+    for x, y, model_names in [
+        (cancer.data, cancer.target, ["LogisticRegression", "LDA"]),
+        (diabetes.data, diabetes.target, ["LinearRegression", "Ridge"]),
+    ]:
+        # the column mask feature selection hands to the objective
+        support = np.arange(x.shape[1]) % 3 != 0
+        objective = allstars.Objective(pd.DataFrame(x), y, support=support)
+        objective.set_model_names(model_names)
+        allstars.search(objective, n_trials=4, show_progress_bar=False, verbose=False)
+        for name, model in objective.best_models.items():
+            expected = model.predict(x, support=objective.support)
+            for compiled in [
+                predictor.compile_linear(objective, name),
+                predictor.compile_linear(model),
+            ]:
+                assert np.allclose(compiled.predict(x), expected)
+
+
+def test_oof_stacking_fits_each_base_model_once(monkeypatch):
+    dataset = sklearn.datasets.load_breast_cancer()
+    objective = allstars.Objective(pd.DataFrame(dataset.data), dataset.target)
+    objective.set_model_names(["LDA", "kNN", "LogisticRegression"])
+    study = optuna.create_study(direction="maximize")
+    for model_name in objective.get_model_names():
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=3)
+
+    calls = []
+    fit_base_model = stacking.fit_base_model
+
+    def counted_fit_base_model(*args):
+        calls.append(args[0])
+        return fit_base_model(*args)
+
+    monkeypatch.setattr(stacking, "fit_base_model", counted_fit_base_model)
+    X_train, X_valid, y_train, y_valid = train_test_split(
+        pd.DataFrame(dataset.data), pd.Series(dataset.target), random_state=0
+    )
+    stacking_objective = stacking.StackingObjective(
+        objective, X_train, y_train, x_valid=X_valid, y_valid=y_valid, verbose=False
+    )
+    stacking.stacking_search(stacking_objective, n_trials=6, show_progress_bar=False)
+    assert len(calls) == len(objective.best_models)
+
+    cache = stacking_objective.oof_cache
+    for name in ["LDA", "kNN"]:
+        model = objective.best_models[name]
+        pipeline = make_pipeline(clone(model.standardizer), clone(model.model))
+        pred = cross_val_predict(
+            pipeline, X_train, y_train, cv=cache.cv, method=cache.methods[name]
+        )
+        assert np.allclose(
+            cache.oof[:, cache.columns[name]],
+            stacking.stack_output(pred, cache.methods[name]),
+        )
+
+
+def test_ensemble_selection_beats_best_single_model():
+    dataset = sklearn.datasets.load_breast_cancer()
+    objective = allstars.Objective(
+        pd.DataFrame(dataset.data), dataset.target, keep_predictions=True
+    )
+    study = optuna.create_study(direction="maximize")
+    for model_name in ["LDA", "kNN", "LogisticRegression", "ExtraTrees"]:
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=4)
+    selection = ensemble.get_best_ensemble(objective, n_iter=20, verbose=False)
+
+    y = objective.y_valid_kept == objective.valid_classes[1]
+    single = max(
+        [
+            f1_score(y, pred >= 0.5)
+            for pred in objective.valid_predictions.values()
+        ]
+    )
+    assert selection.best_score >= single
+    assert np.isclose(selection.weights.sum(), 1)
+    proba = selection.best_model.predict_proba(dataset.data)
+    assert proba.shape == (len(dataset.data), 2)
+
+
+def test_registry_lookup_and_capabilities():
+    family = registry.get_family("LDA")
+    assert family.load().__name__ == "LinearDiscriminantAnalysis"
+    assert family.capable("predict_proba") and family.capable("linear")
+    assert not family.capable("warm_start")
+    lasso = registry.get_family("Lasso", is_regressor=True)
+    assert lasso.create({"alpha": 0.5}).alpha == 0.5
+    with pytest.raises(RuntimeError):
+        registry.get_family("Lasso")
+    with pytest.raises(RuntimeError):
+        registry.get_family("NoSuchModel", is_regressor=True)
+
+    names = ["LDA", "kNN", "RandomForest", "HistGradientBoosting"]
+    assert registry.capable(names, "n_jobs") == ["kNN", "RandomForest"]
+    assert registry.capable(names, "sparse") == ["kNN", "RandomForest"]
+    assert registry.capable(names, "categorical") == ["HistGradientBoosting"]
+    assert registry.get_family("HistGradientBoosting").rounds == "max_iter"
+    objective = allstars.Objective(np.zeros((10, 2)), np.arange(10) % 2)
+    assert set(objective.get_model_names()) <= set(registry.CLASSIFIERS.keys())
+
+
+def test_telemetry_records_and_jsonl():
+    dataset = sklearn.datasets.load_breast_cancer()
+    telemetry_path = os.path.join(tempfile.mkdtemp(), "telemetry.jsonl")
+    records = []
+    objective = allstars.Objective(
+        pd.DataFrame(dataset.data),
+        dataset.target,
+        telemetry_path=telemetry_path,
+        telemetry_callback=records.append,
+    )
+    study = optuna.create_study(direction="maximize")
+    for model_name in ["LDA", "kNN"]:
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=2)
+
+    assert records == objective.telemetry
+    assert [record["model_name"] for record in records] == ["LDA", "kNN"]
+    for record in records:
+        assert record["score"] is not None and record["error"] is None
+        assert record["seconds"]["total"] > 0
+        assert record["n_train"] + record["n_valid"] == len(dataset.data)
+    with open(telemetry_path) as f:
+        loaded = [json.loads(line) for line in f]
+    assert [record["trial"] for record in loaded] == [0, 1]
+    assert loaded == json.loads(json.dumps(records, default=str))
+    table = objective.trials_dataframe()
+    assert len(table) == 2 and "seconds.total" in table.columns
+
+
+def test_model_store_eviction_spilling_and_ceiling():
+    store = model_store.ModelStore(k=2)
+    for key, score in enumerate([0.1, 0.5, 0.3, 0.05]):
+        store.add(key, "LDA", score, np.full(10, key))
+    assert sorted(store.keys()) == [1, 2]
+    assert store.evicted == [0, 3]
+
+    spill_dir = tempfile.mkdtemp()
+    store = model_store.ModelStore(k=1, spill_dir=spill_dir, spill_models=["MLP"])
+    store.add(0, "MLP", 0.9, np.arange(10))
+    store.add(1, "LDA", 0.8, np.arange(5))
+    assert store.entries[0]["model"] is None and os.path.exists(store.entries[0]["path"])
+    assert store.entries[1]["path"] is None
+    assert np.array_equal(store.get(0), np.arange(10))
+    path = store.entries[0]["path"]
+    store.add(2, "MLP", 0.95, np.arange(3))
+    assert 0 not in store and not os.path.exists(path)
+
+    size = store.measure(np.zeros(1000))
+    store = model_store.ModelStore(max_bytes=int(size * 2.5))
+    for key, (model_name, score) in enumerate([("LDA", 0.1), ("kNN", 0.5), ("SVC", 0.3)]):
+        store.add(key, model_name, score, np.zeros(1000))
+    assert sorted(store.keys()) == [1, 2]
+    assert store.memory_bytes() <= store.max_bytes
+    store = model_store.ModelStore(max_bytes=int(size * 2.5), spill_dir=spill_dir)
+    for key, (model_name, score) in enumerate([("LDA", 0.1), ("kNN", 0.5), ("SVC", 0.3)]):
+        store.add(key, model_name, score, np.zeros(1000))
+    assert sorted(store.keys()) == [0, 1, 2]
+    assert store.memory_bytes() <= store.max_bytes
+    assert len([key for key in store.keys() if store.entries[key]["model"] is None]) == 1
+
+    with pytest.raises(ValueError):
+        allstars.Objective(np.zeros((10, 2)), np.arange(10) % 2, model_store=store)
+
+
+def make_source_frame(n_rows=3000):
+    X, y = sklearn.datasets.make_classification(
+        n_samples=n_rows, n_features=5, random_state=0
+    )
+    frame = pd.DataFrame(X, columns=["x{}".format(i) for i in range(5)])
+    frame["y"] = y
+    return frame
+
+
+def test_datasource_streams_only_unsampled_rows(capsys):
+    frame = make_source_frame()
+    frame["row"] = np.arange(len(frame))
+    path = os.path.join(tempfile.mkdtemp(), "train.csv")
+    frame.to_csv(path, index=False)
+    source = datasource.CSVSource(path, "y", chunksize=700)
+    x_train, x_valid, y_train, y_valid = source.sample(1000, 100, random_state=0)
+    sampled = set(x_train["row"]) | set(x_valid["row"])
+    streamed = [x["row"] for x, y in source.iter_xy(skip_sampled=True)]
+    assert sum([len(rows) for rows in streamed]) == len(frame) - 1100
+    assert sampled.isdisjoint(set(np.concatenate(streamed)))
+    assert sum([len(x) for x, y in source.iter_xy()]) == len(frame)
+
+    with pytest.raises(TypeError):
+        datasource.DataSource("y")
+    with pytest.raises(ValueError):
+        allstars.fit(frame.values, verbose=False)
+
+    frame.drop(columns=["row"]).to_csv(path, index=False)
+    source = datasource.CSVSource(path, "y", chunksize=700)
+    objectives = [
+        allstars.build_objective(
+            source,
+            feature_selection=False,
+            verbose=False,
+            max_rows=1000,
+            valid_rows=100,
+            sample_random_state=0,
+        )
+        for _ in range(2)
+    ]
+    assert objectives[0].x_train.equals(objectives[1].x_train)
+    objective = objectives[0]
+    objective.set_model_names(["MLP"])
+    allstars.search(objective, n_trials=1, verbose=False, show_progress_bar=False)
+    capsys.readouterr()
+    allstars.finish(objective, verbose=True)
+    assert "streamed 1900 rows" in capsys.readouterr().out
+    assert objective.best_score == objective.evaluate(
+        objective.best_model, objective.x_valid, objective.y_valid, support=objective.support
+    )
+    assert not objective.score_stale
+
+
+def test_parquet_source():
+    pytest.importorskip("pyarrow")
+    frame = make_source_frame(1000)
+    directory = tempfile.mkdtemp()
+    frame.iloc[:600].to_parquet(os.path.join(directory, "a.parquet"))
+    frame.iloc[600:].to_parquet(os.path.join(directory, "b.parquet"))
+    source = datasource.ParquetSource(directory, "y", chunksize=250)
+    assert source.features() == ["x{}".format(i) for i in range(5)]
+    x_train, x_valid, y_train, y_valid = source.sample(300, 50, random_state=0)
+    assert x_train.shape == (300, 5) and x_valid.shape == (50, 5)
+    assert sum([len(x) for x, y in source.iter_xy(skip_sampled=True)]) == 650
+
+
+def test_stacking_memo_serves_repeated_subsets(monkeypatch):
+    dataset = sklearn.datasets.load_breast_cancer()
+    objective = allstars.Objective(pd.DataFrame(dataset.data), dataset.target)
+    objective.set_model_names(["LDA", "kNN", "LogisticRegression"])
+    study = optuna.create_study(direction="maximize")
+    for model_name in objective.get_model_names():
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=3)
+
+    calls = []
+    fits = []
+    fit_base_model = stacking.fit_base_model
+    meta_stacking = stacking.OOFCache.stacking
+
+    def counted_fit_base_model(*args):
+        calls.append(args[0])
+        return fit_base_model(*args)
+
+    def counted_stacking(self, names, params=None):
+        fits.append(params)
+        return meta_stacking(self, names, params=params)
+
+    monkeypatch.setattr(stacking, "fit_base_model", counted_fit_base_model)
+    monkeypatch.setattr(stacking.OOFCache, "stacking", counted_stacking)
+    X_train, X_valid, y_train, y_valid = train_test_split(
+        pd.DataFrame(dataset.data), pd.Series(dataset.target), random_state=0
+    )
+    stacking_objective = stacking.StackingObjective(
+        objective,
+        X_train,
+        y_train,
+        x_valid=X_valid,
+        y_valid=y_valid,
+        verbose=False,
+        oof=False,
+        saturation=2,
+        random_state=0,
+    )
+    study = optuna.create_study(direction="maximize")
+    config = {
+        "LDA": 1,
+        "kNN": 1,
+        "LogisticRegression": 0,
+        "rf_n_estimators": 50,
+        "rf_warm_start": False,
+        "rf_max_depth": 4,
+        "rf_oob_score": False,
+    }
+    for n_estimators in [50, 50, 50, 60]:
+        study.enqueue_trial(dict(config, rf_n_estimators=n_estimators))
+    study.optimize(stacking_objective, n_trials=4)
+    trials = study.get_trials(states=[optuna.trial.TrialState.COMPLETE])
+    # repeated configurations are served from the memo without refitting
+    assert [trial.user_attrs.get("cached", False) for trial in trials] == [
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert trials[0].value == trials[1].value == trials[2].value
+    assert [params["n_estimators"] for params in fits] == [50, 60]
+    # new meta-learner params on a known subset reuse its base models
+    assert len(calls) == 2
+    assert stacking_objective.hits["110"] == 2
+    # saturated subsets are redirected to an untried one
+    assert len(study.get_trials(states=[optuna.trial.TrialState.WAITING])) == 1
+
+
+def test_stacking_core_budget():
+    n_cores = joblib.cpu_count()
+    assert stacking.core_budget(None, 1) == (1, n_cores)
+    assert stacking.core_budget(None, 100) == (n_cores, 1)
+    assert stacking.core_budget(4, 2) == (2, 2)
+    with stacking.parallel_context("loky", 1, n_jobs=2):
+        assert joblib.effective_n_jobs(None) == 2
+
+
+def test_legacy_stacking_scales_like_the_wrappers():
+    dataset = sklearn.datasets.load_breast_cancer()
+    X_train, X_valid, y_train, y_valid = train_test_split(
+        pd.DataFrame(dataset.data), dataset.target, random_state=0
+    )
+    objective = allstars.Objective(X_train, y_train, x_valid=X_valid, y_valid=y_valid)
+    objective.scalers = ["MinMaxScaler"]
+    objective.set_model_names(["LDA", "kNN"])
+    study = optuna.create_study(direction="maximize")
+    for model_name in objective.get_model_names():
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=2)
+
+    stacking_model = stacking.stacking(objective, use_all=True, verbose=False).fit(
+        X_train, y_train
+    )
+    for name, model in objective.best_models.items():
+        assert np.array_equal(
+            stacking_model.named_estimators_[name].predict(X_valid), model.predict(X_valid)
+        )
+
+
+def test_approximate_ocsvm_matches_exact_ranking():
+    random = np.random.RandomState(0)
+    X = np.vstack([random.normal(size=(1500, 5)), random.normal(3, 1, size=(500, 5))])
+    x = random.normal(0, 2, size=(500, 5))
+    exact = avd.OCSVM(out=0.05, nu=0.05).fit(X)
+    approximate = avd.OCSVM(out=0.05, nu=0.05, approximate=True, random_state=0).fit(X)
+    scores = exact.transform(x)
+    assert spearmanr(scores, approximate.transform(x))[0] > 0.95
+    assert np.mean(approximate.transform_bin(x) == exact.transform_bin(x)) > 0.9
+
+    # the scikit-learn<1.0 fallback solves the same problem
+    linear = avd.LinearOneClassSVM(nu=0.05, random_state=0)
+    feature_map = approximate.model.steps[0][1]
+    linear.fit(feature_map.transform(X))
+    assert spearmanr(scores, linear.decision_function(feature_map.transform(x)))[0] > 0.95
+
+
+def test_report_renders_depict_charts():
+    dataset = sklearn.datasets.load_breast_cancer()
+    X_train, X_test, y_train, y_test = train_test_split(
+        pd.DataFrame(dataset.data), dataset.target, random_state=0
+    )
+    objective = allstars.Objective(X_train, y_train)
+    objective.rf_max_features = ["sqrt"]
+    objective.set_model_names(["LDA", "RandomForest"])
+    study = optuna.create_study(direction="maximize")
+    for model_name in objective.get_model_names():
+        study.enqueue_trial({"model_name": model_name})
+    study.optimize(objective, n_trials=2)
+    stacking_objective = stacking.StackingObjective(
+        objective, X_train, pd.Series(y_train), x_valid=X_test, y_valid=y_test, verbose=False
+    )
+    stacking.stacking_search(stacking_objective, n_trials=1, show_progress_bar=False)
+
+    classification = report.Report(
+        objective, X_test, y_test, stacking_model=stacking_objective
+    )
+    futures = classification.render(wait=False)
+    text = classification.html()
+    assert all([future.done() for future in futures.values()])
+    assert set(classification.outputs.keys()) == set(
+        [
+            "best_scores",
+            "training_summary",
+            "feature_importances",
+            "model_importances",
+            "metrics",
+            "train_test_metrics",
+        ]
+    )
+    assert text.count("data:image/png;base64") == 6
+
+    dataset = sklearn.datasets.load_diabetes()
+    X_train, X_test, y_train, y_test = train_test_split(
+        pd.DataFrame(dataset.data), dataset.target, random_state=0
+    )
+    objective = allstars.Objective(X_train, y_train)
+    study = optuna.create_study(direction="maximize")
+    study.enqueue_trial({"model_name": "kNN"})
+    study.optimize(objective, n_trials=1)
+    regression = report.build_report(objective, X_test, y_test, formats=["svg"])
+    assert set(regression.outputs.keys()) == set(
+        ["best_scores", "training_summary", "metrics", "train_test_metrics"]
+    )
+
+
+def test_stop_returns_during_a_long_fit():
+    X, y = sklearn.datasets.make_classification(
+        n_samples=6000, n_features=40, flip_y=0.3, random_state=0
+    )
+    objective = allstars.Objective(pd.DataFrame(X), y)
+    study = optuna.create_study(direction="maximize")
+    study.enqueue_trial({"model_name": "SVC"})
+    worker = threading.Thread(
+        target=study.optimize, args=(objective,), kwargs={"n_trials": 1}
+    )
+    worker.start()
+    time.sleep(0.5)
+    start = timeit.default_timer()
+    objective.stop()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert timeit.default_timer() - start < 1
+    assert objective.telemetry[-1]["state"] == "stopped"
+
+
+def test_timeouts_off_the_main_thread():
+    @timeout_decorator.timeout(0.1)
+    def slow():
+        time.sleep(0.2)
+        timeout_decorator.check_deadline()
+
+    messages = []
+
+    @timeout.on_timeout(limit=0.1, handler=messages.append, hint="slow")
+    def notified():
+        time.sleep(0.3)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(timeout_decorator.TimeoutError):
+            executor.submit(slow).result()
+        executor.submit(notified).result()
+    assert len(messages) == 1 and "slow" in messages[0]
+
+
 def common_process(dataset):
     X_train, X_test, y_train, y_test = train_test_split(
         dataset.data, dataset.target, test_size=0.4
@@ -30,15 +860,31 @@ def common_process(dataset):
         n_trials=10,
         feature_selection=True,
         show_progress_bar=False,
+        keep_predictions=True,
     )
     depict.feature_importances(allstars_model)
     depict.training_summary(allstars_model)
     depict.best_scores(allstars_model)
     depict.all_metrics(allstars_model, X_train, y_train)
     depict.all_metrics(allstars_model, X_test, y_test)
+    table = evaluation.evaluate(allstars_model, X_test, y_test).table
+    assert set(table["model"]) == set(allstars_model.best_models.keys())
+    report.build_report(
+        allstars_model, X_test, y_test, html_file=os.path.join(tempfile.mkdtemp(), "report.html")
+    )
     allstars_model.score(X_train, y_train), allstars_model.score(X_test, y_test)
     depict.metrics(allstars_model, X_train, y_train, X_test, y_test)
     allstars_model.predict(X_test)
+    allstars_model.fit_domain("knn")
+    pred, in_domain = allstars_model.predict(X_test, return_domain=True)
+    assert len(in_domain) == len(pred)
+    filename = os.path.join(tempfile.mkdtemp(), "allstars.joblib")
+    predictor.save(allstars_model, filename)
+    predictor.load(filename).predict(X_test, return_domain=True)
+    for name in allstars_model.best_models.keys():
+        if name in predictor.LINEAR_MODELS:
+            linear_model = predictor.compile_linear(allstars_model, name)
+            predictor.latency(linear_model.predict, X_test)
     stacking_model = allstars.get_best_stacking(
         allstars_model,
         X_train,
@@ -51,6 +897,10 @@ def common_process(dataset):
     depict.metrics(stacking_model, X_train, y_train, X_test, y_test)
     depict.model_importances(stacking_model)
     stacking_model.predict(X_test)
+    predictor.export(stacking_model).predict(X_test)
+    ensemble_model = ensemble.get_best_ensemble(allstars_model)
+    ensemble_model.score(X_train, y_train), ensemble_model.score(X_test, y_test)
+    ensemble_model.predict(X_test)
 
 
 def main():